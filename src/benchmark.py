@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017-2023 Denis Meyer
+#
+# This file is part of the monopoly probabilities application.
+#
+
+"""Monopoly Probabilities - Benchmark
+
+Measures roll throughput per engine and process count, GUI refresh latency and startup time,
+and stores the results as JSON to compare them between commits.
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import numpy as np
+
+from threads.game import Game
+from threads.parallelgame import ParallelGame
+
+# Game arguments and rolls per call of every engine
+ENGINES = {
+    'scalar': (dict(engine='scalar', rules='simple'), 10000),
+    'batch': (dict(engine='batch', rules='simple'), 1000000),
+    'batch-full': (dict(engine='batch', rules='full'), 1000000)
+}
+
+IMPORTS = ['threads.game', 'headless', 'gui.gui']
+
+# Run in a subprocess, prints the seconds from interpreter start until the window is drawn
+_WINDOW_SCRIPT = '''
+import time
+start = time.perf_counter()
+import os
+from gui.gui import MonopolyGUI
+gui = MonopolyGUI(curr_workdir=os.getcwd())
+gui._initgui()
+gui.update()
+print(time.perf_counter() - start)
+'''
+
+def _commit():
+    """Returns the current git commit or None"""
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def throughput(engine, seconds=2.0):
+    """Returns the rolls per second of an engine running on the calling thread"""
+    gameargs, chunk = ENGINES[engine]
+    game = Game(afterround_n_rounds=chunk, **gameargs)
+    game.roll(chunk) # warm up
+    start = time.perf_counter()
+    nrofrolls = game.nrofrolls
+    while time.perf_counter() - start < seconds:
+        game.roll(chunk)
+    return (game.nrofrolls - nrofrolls) / (time.perf_counter() - start)
+
+def parallelthroughput(nrofprocesses, seconds=3.0, rules='simple'):
+    """Returns the rolls per second of a ParallelGame, not counting the worker startup"""
+    game = ParallelGame(nrofprocesses=nrofprocesses, rules=rules, rolls_per_message=100000)
+    game.start()
+    game.resume()
+    while game.nrofrolls < nrofprocesses * game.rolls_per_message:
+        time.sleep(0.01)
+    start = time.perf_counter()
+    nrofrolls = game.nrofrolls
+    time.sleep(seconds)
+    rate = (game.nrofrolls - nrofrolls) / (time.perf_counter() - start)
+    game.stop().result()
+    return rate
+
+def refreshlatency(update_every_n_rounds, seconds=2.0):
+    """Returns the mean refresh latency in seconds, the refreshes and the roll rate while rendering"""
+    from gui.gui import MonopolyGUI
+    gui = MonopolyGUI(curr_workdir=os.getcwd(), update_every_n_rounds=update_every_n_rounds, engine='batch')
+    gui._initgui()
+    durations = []
+    update = gui._update_streetprobabilities
+    def timedupdate():
+        start = time.perf_counter()
+        update()
+        durations.append(time.perf_counter() - start)
+    gui._update_streetprobabilities = timedupdate
+    gui.game.start()
+    gui.game.resume()
+    gui._poll_snapshot()
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        gui.update()
+        time.sleep(0.001)
+    rate = gui.game.nrofrolls / (time.perf_counter() - start)
+    gui.game.stop()
+    gui.game.stopped.result() # the game thread must not roll during the next case
+    gui.master.destroy()
+    return {'latency': float(np.mean(durations)) if durations else None, 'refreshes': len(durations), 'rolls_per_second': rate}
+
+def importtime(module, repeat=3):
+    """Returns the fastest cold import time of a module in a fresh interpreter"""
+    times = []
+    for _ in range(repeat):
+        result = subprocess.run([sys.executable, '-c',
+                                 'import time; t = time.perf_counter(); import {}; print(time.perf_counter() - t)'.format(module)],
+                                capture_output=True, text=True)
+        if result.returncode != 0:
+            return None
+        times.append(float(result.stdout.split()[-1]))
+    return min(times)
+
+def windowtime():
+    """Returns the seconds until the main window is drawn, None without a display"""
+    result = subprocess.run([sys.executable, '-c', _WINDOW_SCRIPT], capture_output=True, text=True)
+    return float(result.stdout.split()[-1]) if result.returncode == 0 else None
+
+def run(seconds=2.0, processes=None, refresh=(10000, 100000, 1000000)):
+    """Runs all benchmarks and returns the results"""
+    processes = processes or sorted(set([1, 2, os.cpu_count() or 1]))
+    results = {
+        'commit': _commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'cpus': os.cpu_count(),
+        'rolls_per_second': {},
+        'parallel_rolls_per_second': {},
+        'refresh': {},
+        'import_seconds': {},
+        'window_seconds': None
+    }
+    for engine in ENGINES:
+        results['rolls_per_second'][engine] = throughput(engine, seconds)
+        print('{}: {:,.0f} rolls/s'.format(engine, results['rolls_per_second'][engine]), file=sys.stderr)
+    for nrofprocesses in processes:
+        results['parallel_rolls_per_second'][str(nrofprocesses)] = parallelthroughput(nrofprocesses, seconds)
+        print('{} processes: {:,.0f} rolls/s'.format(nrofprocesses,
+                                                   results['parallel_rolls_per_second'][str(nrofprocesses)]),
+              file=sys.stderr)
+    for update_every_n_rounds in refresh:
+        try:
+            results['refresh'][str(update_every_n_rounds)] = refreshlatency(update_every_n_rounds, seconds)
+        except Exception as e:
+            print('Skipping refresh benchmark', e, file=sys.stderr)
+            break
+    for module in IMPORTS:
+        results['import_seconds'][module] = importtime(module)
+    results['window_seconds'] = windowtime()
+    return results
+
+def _flatten(results, prefix=''):
+    """Returns the numeric results keyed by their dotted path"""
+    values = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            values.update(_flatten(value, '{}{}.'.format(prefix, key)))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            values[prefix + key] = value
+    return values
+
+def compare(baseline, results, output=sys.stdout):
+    """Writes the ratio of every result to the baseline"""
+    old = _flatten(baseline)
+    new = _flatten(results)
+    output.write('{:50} {:>14} {:>14} {:>8}\n'.format('benchmark', 'baseline', 'current', 'ratio'))
+    for key in sorted(set(old) & set(new)):
+        ratio = new[key] / old[key] if old[key] else float('nan')
+        output.write('{:50} {:>14.6g} {:>14.6g} {:>8.3f}\n'.format(key, old[key], new[key], ratio))
+
+def main(args=None):
+    """Runs the benchmarks"""
+    parser = argparse.ArgumentParser(description='Benchmarks the Monopoly probabilities simulation')
+    parser.add_argument('--seconds', type=float, default=2.0, help='seconds per throughput measurement')
+    parser.add_argument('--processes', type=int, nargs='*', default=None, help='process counts to measure')
+    parser.add_argument('--output', default=None, help='JSON result file')
+    parser.add_argument('--compare', default=None, help='JSON result file of a previous run to compare with')
+    args = parser.parse_args(args)
+    results = run(seconds=args.seconds, processes=args.processes)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=4)
+    else:
+        json.dump(results, sys.stdout, indent=4)
+        sys.stdout.write('\n')
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            compare(json.load(f), results)
+
+if __name__ == '__main__':
+    main()
@@ -8,10 +8,134 @@
 
 """Monopoly Probabilities - Board"""
 
+import hashlib
+import json
+import os
+
 class Board:
-    """The monopoly board data"""
+    """The monopoly board data
+
+    'simple' rules only sum the dice and jump from the jail field to jail.
+    'full' rules add doubles, three doubles to jail, leaving jail and the card decks.
+    """
 
-    def __init__(self):
+    def __init__(self, rules='simple'):
+        if rules not in ('simple', 'full'):
+            raise ValueError('Unknown rules \'{}\''.format(rules))
+        self.rules = rules
         self.specialfields = [0, 10, 20, 30]
         self.jailfield = 30
+        self.jailposition = 10
         self.nroffields = 40
+        self.nrofdice = 2
+        # The simple rules keep the original zero-based dice
+        self.dicemin = 0 if rules == 'simple' else 1
+        self.dicemax = 6
+        # Full rules only
+        self.maxdoubles = 3
+        self.maxjailturns = 3
+        self.railroads = [5, 15, 25, 35]
+        self.utilities = [12, 28]
+        self.chancefields = [7, 22, 36]
+        self.communitychestfields = [2, 17, 33]
+        # Card destinations: a field number, 'jail', 'back3', 'railroad', 'utility' or None to stay
+        self.chancecards = [0, 24, 11, 'utility', 'railroad', 'railroad', 5, 39, 'back3', 'jail'] + [None] * 6
+        self.communitychestcards = [0, 'jail'] + [None] * 14
+        # Properties: rents without houses, with 1-4 houses and with a hotel
+        self.streets = [
+            {'field': 1, 'name': 'Mediterranean Avenue', 'group': 'brown', 'price': 60, 'housecost': 50,
+             'rents': [2, 10, 30, 90, 160, 250]},
+            {'field': 3, 'name': 'Baltic Avenue', 'group': 'brown', 'price': 60, 'housecost': 50,
+             'rents': [4, 20, 60, 180, 320, 450]},
+            {'field': 6, 'name': 'Oriental Avenue', 'group': 'lightblue', 'price': 100, 'housecost': 50,
+             'rents': [6, 30, 90, 270, 400, 550]},
+            {'field': 8, 'name': 'Vermont Avenue', 'group': 'lightblue', 'price': 100, 'housecost': 50,
+             'rents': [6, 30, 90, 270, 400, 550]},
+            {'field': 9, 'name': 'Connecticut Avenue', 'group': 'lightblue', 'price': 120, 'housecost': 50,
+             'rents': [8, 40, 100, 300, 450, 600]},
+            {'field': 11, 'name': 'St. Charles Place', 'group': 'pink', 'price': 140, 'housecost': 100,
+             'rents': [10, 50, 150, 450, 625, 750]},
+            {'field': 13, 'name': 'States Avenue', 'group': 'pink', 'price': 140, 'housecost': 100,
+             'rents': [10, 50, 150, 450, 625, 750]},
+            {'field': 14, 'name': 'Virginia Avenue', 'group': 'pink', 'price': 160, 'housecost': 100,
+             'rents': [12, 60, 180, 500, 700, 900]},
+            {'field': 16, 'name': 'St. James Place', 'group': 'orange', 'price': 180, 'housecost': 100,
+             'rents': [14, 70, 200, 550, 750, 950]},
+            {'field': 18, 'name': 'Tennessee Avenue', 'group': 'orange', 'price': 180, 'housecost': 100,
+             'rents': [14, 70, 200, 550, 750, 950]},
+            {'field': 19, 'name': 'New York Avenue', 'group': 'orange', 'price': 200, 'housecost': 100,
+             'rents': [16, 80, 220, 600, 800, 1000]},
+            {'field': 21, 'name': 'Kentucky Avenue', 'group': 'red', 'price': 220, 'housecost': 150,
+             'rents': [18, 90, 250, 700, 875, 1050]},
+            {'field': 23, 'name': 'Indiana Avenue', 'group': 'red', 'price': 220, 'housecost': 150,
+             'rents': [18, 90, 250, 700, 875, 1050]},
+            {'field': 24, 'name': 'Illinois Avenue', 'group': 'red', 'price': 240, 'housecost': 150,
+             'rents': [20, 100, 300, 750, 925, 1100]},
+            {'field': 26, 'name': 'Atlantic Avenue', 'group': 'yellow', 'price': 260, 'housecost': 150,
+             'rents': [22, 110, 330, 800, 975, 1150]},
+            {'field': 27, 'name': 'Ventnor Avenue', 'group': 'yellow', 'price': 260, 'housecost': 150,
+             'rents': [22, 110, 330, 800, 975, 1150]},
+            {'field': 29, 'name': 'Marvin Gardens', 'group': 'yellow', 'price': 280, 'housecost': 150,
+             'rents': [24, 120, 360, 850, 1025, 1200]},
+            {'field': 31, 'name': 'Pacific Avenue', 'group': 'green', 'price': 300, 'housecost': 200,
+             'rents': [26, 130, 390, 900, 1100, 1275]},
+            {'field': 32, 'name': 'North Carolina Avenue', 'group': 'green', 'price': 300, 'housecost': 200,
+             'rents': [26, 130, 390, 900, 1100, 1275]},
+            {'field': 34, 'name': 'Pennsylvania Avenue', 'group': 'green', 'price': 320, 'housecost': 200,
+             'rents': [28, 150, 450, 1000, 1200, 1400]},
+            {'field': 37, 'name': 'Park Place', 'group': 'darkblue', 'price': 350, 'housecost': 200,
+             'rents': [35, 175, 500, 1100, 1300, 1500]},
+            {'field': 39, 'name': 'Boardwalk', 'group': 'darkblue', 'price': 400, 'housecost': 200,
+             'rents': [50, 200, 600, 1400, 1700, 2000]}
+        ]
+        self.railroadprice = 200
+        # Rent by number of railroads owned
+        self.railroadrents = [25, 50, 100, 200]
+        self.utilityprice = 150
+        # Rent as multiple of the dice sum by number of utilities owned
+        self.utilitymultipliers = [4, 10]
+
+    def validate(self):
+        """Raises a ValueError if the board refers to fields that do not exist"""
+        fields = [self.jailfield, self.jailposition] + self.chancefields + self.communitychestfields
+        fields += self.railroads + self.utilities + [street['field'] for street in self.streets]
+        fields += [card for card in self.chancecards + self.communitychestcards if isinstance(card, int)]
+        for field in fields:
+            if not 0 <= field < self.nroffields:
+                raise ValueError('Field {} is not on the board of {} fields'.format(field, self.nroffields))
+
+    def todict(self):
+        """Returns the board definition as JSON serializable data"""
+        return dict(self.__dict__)
+
+    def gethash(self):
+        """Returns a hash of the board definition, equal boards have equal hashes"""
+        definition = json.dumps(self.todict(), sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(definition.encode('utf-8')).hexdigest()
+
+def loadboard(path):
+    """Loads a board from a JSON or TOML file, missing keys default to the rules' standard board"""
+    if os.path.splitext(path)[1].lower() == '.toml':
+        try:
+            import tomllib
+        except ImportError as e:
+            raise ValueError('TOML boards need Python 3.11 or newer: {}'.format(path)) from e
+        with open(path, 'rb') as f:
+            definition = tomllib.load(f)
+    else:
+        with open(path, 'r', encoding='utf-8') as f:
+            definition = json.load(f)
+    try:
+        return fromdict(definition)
+    except ValueError as e:
+        raise ValueError('{} in {}'.format(e, path)) from e
+
+def fromdict(definition):
+    """Returns the board of a definition as written by Board.todict, missing keys default to the standard board"""
+    board = Board(definition.get('rules', 'simple'))
+    unknown = set(definition) - set(board.__dict__)
+    if unknown:
+        raise ValueError('Unknown board keys {}'.format(sorted(unknown)))
+    board.__dict__.update(definition)
+    board.validate()
+    return board
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017-2023 Denis Meyer
+#
+# This file is part of the monopoly probabilities application.
+#
+
+"""Monopoly Probabilities - Checkpoint
+
+Binary layout (little endian):
+    header:   magic 'MPCK', uint16 version, uint16 nroffields, uint32 rng state length
+    counters: int64 nrofrolls, int64 currposition, int64 visits[nroffields]
+    rng:      UTF-8 JSON of the random generator state
+"""
+
+import json
+import os
+import struct
+import threading
+import numpy as np
+
+MAGIC = b'MPCK'
+VERSION = 1
+_HEADER = struct.Struct('<4sHHI')
+
+def write_checkpoint(path, nrofrolls, currposition, visits, rngstate):
+    """Writes a checkpoint atomically, readers see either the old or the new file"""
+    counters = np.array([nrofrolls, currposition] + [int(v) for v in visits], dtype='<i8')
+    state = json.dumps(rngstate).encode('utf-8')
+    tmppath = '{}.{}.{}.tmp'.format(path, os.getpid(), threading.get_ident())
+    with open(tmppath, 'wb') as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, len(visits), len(state)))
+        f.write(counters.tobytes())
+        f.write(state)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmppath, path)
+
+def read_checkpoint(path):
+    """Reads a checkpoint, returns the number of rolls, the current position, the visits and the rng state"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    magic, version, nroffields, statelength = _HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError('Not a checkpoint file (version {}): {}'.format(VERSION, path))
+    offset = _HEADER.size
+    counters = np.frombuffer(data, dtype='<i8', count=nroffields + 2, offset=offset)
+    offset += counters.nbytes
+    rngstate = json.loads(data[offset:offset + statelength].decode('utf-8'))
+    return int(counters[0]), int(counters[1]), [int(v) for v in counters[2:]], rngstate
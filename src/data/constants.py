@@ -6,6 +6,14 @@
 # This file is part of the COYO CSV user importer.
 #
 
+import os
+
+PATHS = {
+    # Compiled board tables, keyed by board hash
+    'cache': os.environ.get('MONOPOLY_PROBABILITIES_CACHE',
+                            os.path.join(os.path.expanduser('~'), '.cache', 'monopoly_probabilities'))
+}
+
 SIZES = {
     'canvas': 1000,
     'img_board': 920
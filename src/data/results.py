@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017-2023 Denis Meyer
+#
+# This file is part of the monopoly probabilities application.
+#
+
+"""Monopoly Probabilities - Results
+
+On-disk store of simulation results. Every configuration (board, rules, engine, seed, ...)
+keeps one checkpoint with its counters and random state, so a later run of the same
+configuration continues where the last one stopped instead of starting from zero.
+"""
+
+import hashlib
+import json
+import os
+import os.path
+
+from data.constants import PATHS
+
+class ResultStore:
+    """Checkpoints keyed by configuration hash, least recently used ones are evicted above maxbytes"""
+
+    def __init__(self, cachedir=PATHS['cache'], maxbytes=64 * 1024 * 1024):
+        self.cachedir = os.path.join(cachedir, 'results')
+        self.maxbytes = maxbytes
+        os.makedirs(self.cachedir, exist_ok=True)
+
+    def key(self, config):
+        """Returns the key of a JSON serializable configuration"""
+        definition = json.dumps(config, sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(definition.encode('utf-8')).hexdigest()
+
+    def path(self, key):
+        """Returns the checkpoint path of a key"""
+        return os.path.join(self.cachedir, '{}.mpck'.format(key))
+
+    def touch(self, key):
+        """Marks a result as used, returns whether it exists"""
+        try:
+            os.utime(self.path(key))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def evict(self, keep=None):
+        """Removes the least recently used results until the store fits maxbytes, never the key keep"""
+        entries = []
+        for name in os.listdir(self.cachedir):
+            if not name.endswith('.mpck'):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.cachedir, name))
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.maxbytes:
+                break
+            if keep and name == os.path.basename(self.path(keep)):
+                continue
+            try:
+                os.remove(os.path.join(self.cachedir, name))
+            except FileNotFoundError:
+                pass
+            total -= size
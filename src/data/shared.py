@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017-2023 Denis Meyer
+#
+# This file is part of the monopoly probabilities application.
+#
+
+"""Monopoly Probabilities - Shared Counters
+
+Named shared memory block with the published counters of a running game.
+Layout (little endian):
+    header:   magic 'MPSH', uint16 version, uint16 nroffields, uint32 board length,
+              uint64 sequence, uint64 flags (bit 0: converged)
+    counters: int64 nrofrolls, int64 visits[nroffields]
+    board:    UTF-8 JSON of the board definition
+The single writer makes the sequence odd while it writes, readers retry until they
+read the same even sequence before and after copying the counters.
+"""
+
+import json
+import struct
+import time
+from multiprocessing import shared_memory
+import numpy as np
+
+MAGIC = b'MPSH'
+VERSION = 1
+_HEADER = struct.Struct('<4sHHIQQ')
+_SEQUENCE = struct.Struct('<Q')
+_SEQUENCE_OFFSET = 12
+_FLAGS_OFFSET = 20
+
+def _attach(name):
+    """Attaches to an existing block without letting this process unlink it on exit"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Before Python 3.13 every attached block is registered and unlinked at exit
+        from multiprocessing import resource_tracker
+        block = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(block._name, 'shared_memory')
+        return block
+
+class SharedCounters:
+    """The counters of one game in shared memory, created by the game and attached by viewers"""
+
+    def __init__(self, name, board=None):
+        """Creates the block if a board is given, otherwise attaches to it"""
+        self.name = name
+        self.owner = board is not None
+        if self.owner:
+            definition = json.dumps(board.todict()).encode('utf-8')
+            nroffields = board.nroffields
+            self.block = shared_memory.SharedMemory(name=name, create=True,
+                                                    size=_HEADER.size + 8 * (nroffields + 1) + len(definition))
+            self.block.buf[:_HEADER.size] = _HEADER.pack(MAGIC, VERSION, nroffields, len(definition), 0, 0)
+            offset = _HEADER.size + 8 * (nroffields + 1)
+            self.block.buf[offset:offset + len(definition)] = definition
+        else:
+            self.block = _attach(name)
+            magic, version, nroffields, length, _, _ = _HEADER.unpack_from(self.block.buf)
+            if magic != MAGIC or version != VERSION:
+                self.block.close()
+                raise ValueError('Not a shared counters block (version {}): {}'.format(VERSION, name))
+            offset = _HEADER.size + 8 * (nroffields + 1)
+            self.definition = json.loads(bytes(self.block.buf[offset:offset + length]).decode('utf-8'))
+        self.nroffields = nroffields
+        self.counters = np.ndarray(nroffields + 1, dtype='<i8', buffer=self.block.buf, offset=_HEADER.size)
+        if not self.owner:
+            self.counters.flags.writeable = False
+
+    def _sequence(self):
+        """Returns the current sequence number"""
+        return _SEQUENCE.unpack_from(self.block.buf, _SEQUENCE_OFFSET)[0]
+
+    def write(self, nrofrolls, visits, converged=False):
+        """Writes the counters, called by the owning game's thread only"""
+        sequence = self._sequence()
+        _SEQUENCE.pack_into(self.block.buf, _SEQUENCE_OFFSET, sequence + 1)
+        self.counters[0] = nrofrolls
+        self.counters[1:] = visits
+        _SEQUENCE.pack_into(self.block.buf, _FLAGS_OFFSET, int(converged))
+        _SEQUENCE.pack_into(self.block.buf, _SEQUENCE_OFFSET, sequence + 2)
+
+    def read(self, since=None):
+        """Returns the sequence, the number of rolls, the visits and the converged flag
+
+        Returns None if the sequence still equals since, i.e. nothing was written since.
+        """
+        while True:
+            sequence = self._sequence()
+            if sequence == since:
+                return None
+            if sequence % 2:
+                time.sleep(0)
+                continue
+            counters = self.counters.copy()
+            flags = _SEQUENCE.unpack_from(self.block.buf, _FLAGS_OFFSET)[0]
+            if self._sequence() == sequence:
+                return sequence, int(counters[0]), counters[1:], bool(flags & 1)
+
+    def close(self):
+        """Detaches, the owner also removes the block"""
+        self.counters = None
+        self.block.close()
+        if self.owner:
+            self.block.unlink()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017-2023 Denis Meyer
+#
+# This file is part of the monopoly probabilities application.
+#
+
+"""Monopoly Probabilities - Trajectory
+
+Binary layout (little endian):
+    header: magic 'MPTR', uint16 version, uint16 nroffields, uint8 nrofdice, uint8 dicemin,
+            uint8 dicemax, uint8 compressed, uint16 jailfield, uint16 jailposition,
+            uint16 startposition
+    blocks: uint32 nrofrolls, uint32 payload length, payload
+    payload (zlib compressed if compressed):
+            uint8 dice[nrofrolls][ceil(nrofdice / 2)], two dice per byte as value - dicemin in 4 bits
+            uint8 positions[nrofrolls], the position after every roll
+    A block of 0 rolls marks the start of a segment, its payload is the uint64 number of
+    rolls of the game and the uint16 position before the segment. Every recording starts
+    a segment, the header's startposition is the one of the first segment.
+"""
+
+import os
+import struct
+import zlib
+import numpy as np
+
+MAGIC = b'MPTR'
+VERSION = 2
+HEADER = struct.Struct('<4sHHBBBBHHH')
+BLOCK = struct.Struct('<II')
+SEGMENT = struct.Struct('<QH')
+
+def packdice(dice, dicemin):
+    """Packs a (rolls, dice) array into two dice per byte"""
+    dice = np.asarray(dice, dtype=np.uint8) - np.uint8(dicemin)
+    if dice.shape[1] % 2:
+        dice = np.concatenate((dice, np.zeros((len(dice), 1), dtype=np.uint8)), axis=1)
+    return dice[:, 0::2] | (dice[:, 1::2] << 4)
+
+def unpackdice(packed, nrofdice, dicemin):
+    """Unpacks two dice per byte into a (rolls, dice) array"""
+    dice = np.empty((len(packed), packed.shape[1] * 2), dtype=np.uint8)
+    dice[:, 0::2] = packed & 0x0F
+    dice[:, 1::2] = packed >> 4
+    return dice[:, :nrofdice] + np.uint8(dicemin)
+
+def decodeblock(payload, nrofrolls, nrofdice, dicemin, compressed):
+    """Returns the (rolls, dice) array and the positions of a block payload"""
+    if compressed:
+        payload = zlib.decompress(payload)
+    nrofbytes = (nrofdice + 1) // 2
+    packed = np.frombuffer(payload, dtype=np.uint8, count=nrofrolls * nrofbytes)
+    positions = np.frombuffer(payload, dtype=np.uint8, count=nrofrolls, offset=nrofrolls * nrofbytes)
+    return unpackdice(packed.reshape(nrofrolls, nrofbytes), nrofdice, dicemin), positions
+
+class TrajectoryWriter:
+    """Records the dice and positions of every roll in compressed blocks
+
+    A new recording replaces the file. A resumed recording keeps the rolls of the file up
+    to the checkpoint, i.e. the game's nrofrolls, drops the rolls recorded after it and
+    continues in a new segment. If the file holds fewer rolls, the new segment follows a gap.
+    """
+
+    def __init__(self, path, board, startposition=0, nrofrolls=0, resume=False, compress=True, blocksize=1 << 20):
+        if board.dicemax - board.dicemin > 15:
+            raise ValueError('Trajectories need dice with at most 16 values')
+        if board.nroffields > 256:
+            raise ValueError('Trajectories need boards with at most 256 fields')
+        self.board = board
+        self.compress = compress
+        self.dice = np.empty((blocksize, board.nrofdice), dtype=np.uint8)
+        self.positions = np.empty(blocksize, dtype=np.uint8)
+        self.count = 0
+        header = HEADER.pack(MAGIC, VERSION, board.nroffields, board.nrofdice, board.dicemin, board.dicemax,
+                             int(compress), board.jailfield, board.jailposition, startposition)
+        if resume and os.path.exists(path) and os.path.getsize(path) >= HEADER.size:
+            with open(path, 'rb') as f:
+                existing = f.read(HEADER.size)
+            # Everything but the start position has to match to continue a file
+            if existing[:-2] != header[:-2]:
+                raise ValueError('Trajectory file of a different board or format: {}'.format(path))
+            self.file = open(path, 'r+b')
+            self._truncate(nrofrolls)
+        else:
+            self.file = open(path, 'wb')
+            self.file.write(header)
+        self.file.write(BLOCK.pack(0, SEGMENT.size))
+        self.file.write(SEGMENT.pack(nrofrolls, startposition))
+        self.file.flush()
+
+    def _truncate(self, nrofrolls):
+        """Cuts the file after the first nrofrolls rolls of the game, splitting a block if needed"""
+        size = os.fstat(self.file.fileno()).st_size
+        offset = HEADER.size
+        rolls = 0 # rolls of the game up to offset
+        split = None
+        while offset + BLOCK.size <= size:
+            self.file.seek(offset)
+            count, length = BLOCK.unpack(self.file.read(BLOCK.size))
+            if offset + BLOCK.size + length > size:
+                break # partly written last block
+            if count == 0:
+                rolls, _ = SEGMENT.unpack(self.file.read(SEGMENT.size))
+                if rolls >= nrofrolls:
+                    break
+            elif rolls + count > nrofrolls:
+                split = (nrofrolls - rolls, count, self.file.read(length))
+                break
+            else:
+                rolls += count
+            offset += BLOCK.size + length
+        self.file.seek(offset)
+        self.file.truncate()
+        if split:
+            keep, count, payload = split
+            dice, positions = decodeblock(payload, count, self.board.nrofdice, self.board.dicemin, self.compress)
+            self.write(dice[:keep], positions[:keep])
+            self.flush()
+
+    def append(self, dice, position):
+        """Records a single roll"""
+        self.dice[self.count] = dice
+        self.positions[self.count] = position
+        self.count += 1
+        if self.count == len(self.positions):
+            self.flush()
+
+    def write(self, dice, positions):
+        """Records the (rolls, dice) array and the positions of many rolls"""
+        done = 0
+        while done < len(positions):
+            n = min(len(positions) - done, len(self.positions) - self.count)
+            self.dice[self.count:self.count + n] = dice[done:done + n]
+            self.positions[self.count:self.count + n] = positions[done:done + n]
+            self.count += n
+            done += n
+            if self.count == len(self.positions):
+                self.flush()
+
+    def flush(self):
+        """Writes the buffered rolls as one block"""
+        if not self.count:
+            return
+        payload = packdice(self.dice[:self.count], self.board.dicemin).tobytes() + self.positions[:self.count].tobytes()
+        if self.compress:
+            payload = zlib.compress(payload, 1)
+        self.file.write(BLOCK.pack(self.count, len(payload)))
+        self.file.write(payload)
+        self.file.flush()
+        self.count = 0
+
+    def close(self):
+        """Writes the last block and closes the file"""
+        self.flush()
+        self.file.close()
@@ -15,9 +15,11 @@ class Translations:
         'GUI.ACTIONS.CLICKTOSTART': 'Click to start simulating',
         'GUI.ACTIONS.PAUSING': 'Not simulating.',
         'GUI.ACTIONS.PROCESSING': 'Simulating...',
+        'GUI.ACTIONS.VIEWING': 'Viewing \'{}\' (read-only)',
         'GUI.LABELS.STATUS': 'Status:',
         'GUI.LABELS.ROUNDS': 'Rounds: {:,}',
         'GUI.LABELS.PROB': '{:2.3f}%',
+        'GUI.LABELS.BESTPAYBACK': 'Best hotel: {} ({:,.0f} turns to pay back)',
         'GUI.LABELS.PROBABILITYCMAP': 'Probability Colormap:',
         'GUI.WINDOW.TITLE': 'Monopoly Probabilities'
     }
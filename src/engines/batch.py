@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017-2023 Denis Meyer
+#
+# This file is part of the monopoly probabilities application.
+#
+
+"""Monopoly Probabilities - Batch Engine"""
+
+from math import gcd
+import numpy as np
+
+from engines.rules import RulesEngine
+
+def _scan(maps):
+    """Returns the inclusive prefix composition of the given state maps"""
+    maps = maps.copy()
+    shift = 1
+    while shift < len(maps):
+        maps[shift:] = np.take_along_axis(maps[shift:], maps[:-shift], axis=1)
+        shift *= 2
+    return maps
+
+class BatchEngine:
+    """Rolls the dice in vectorized chunks
+
+    Positions are advanced with a cumulative sum modulo the number of fields.
+    Every "Go To Jail" reset moves the player back by a constant distance, so the
+    real position only differs from the unreset position by a multiple of that
+    distance. The multiple is tracked as a small state machine which is
+    resolved for all jail candidates of a chunk at once via a prefix scan.
+    """
+
+    def __init__(self, board, rng=None, chunksize=1000000):
+        self.board = board
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.chunksize = chunksize
+        # Optional TrajectoryWriter, gets the dice and positions of every chunk
+        self.recorder = None
+        self._compile()
+
+    def _compile(self):
+        """Precomputes the jail lookup tables"""
+        nroffields = self.board.nroffields
+        distance = (self.board.jailfield - self.board.jailposition) % nroffields
+        nrofstates = nroffields // gcd(distance, nroffields)
+        states = np.arange(nrofstates)
+        self.shifts = (-states * distance) % nroffields
+        self.eventtypes = np.full(nroffields, -1, dtype=np.intp)
+        self.eventtypes[(self.board.jailfield + states * distance) % nroffields] = states
+        self.eventmaps = np.tile(states, (nrofstates, 1))
+        self.eventmaps[states, states] = (states + 1) % nrofstates
+
+    def getstate(self):
+        """Returns the engine state as JSON serializable data"""
+        return {'bitgenerator': self.rng.bit_generator.state}
+
+    def setstate(self, state):
+        """Restores the engine state"""
+        self.rng.bit_generator.state = state['bitgenerator']
+
+    def roll(self, currposition, nrofrolls):
+        """Rolls the dice nrofrolls times, returns the visits and the new current position"""
+        visits = np.zeros(self.board.nroffields, dtype=np.int64)
+        done = 0
+        while done < nrofrolls:
+            n = min(self.chunksize, nrofrolls - done)
+            chunkvisits, currposition = self._roll_chunk(currposition, n)
+            visits += chunkvisits
+            done += n
+        return visits, currposition
+
+    def _roll_chunk(self, currposition, nrofrolls):
+        """Rolls a single chunk"""
+        dice = self.rng.integers(self.board.dicemin,
+                                 self.board.dicemax + 1,
+                                 size=(nrofrolls, self.board.nrofdice))
+        visits, positions = self.move(currposition, dice)
+        if self.recorder:
+            self.recorder.write(dice, positions)
+        return visits, int(positions[-1])
+
+    def move(self, currposition, dice):
+        """Moves by the given (rolls, dice) array, returns the visits and the position after every roll"""
+        nroffields = self.board.nroffields
+        nrofrolls = len(dice)
+        unreset = (currposition + np.cumsum(dice.sum(axis=1))) % nroffields
+        types = self.eventtypes[unreset]
+        events = np.flatnonzero(types >= 0)
+        nrofjumps = 0
+        if events.size:
+            eventtypes = types[events]
+            after = _scan(self.eventmaps[eventtypes])[:, 0]
+            before = np.concatenate(([0], after[:-1]))
+            nrofjumps = np.count_nonzero(before == eventtypes)
+            marker = np.zeros(nrofrolls, dtype=np.intp)
+            marker[events] = np.arange(1, events.size + 1)
+            states = np.concatenate(([0], after))[np.maximum.accumulate(marker)]
+            positions = (unreset + self.shifts[states]) % nroffields
+        else:
+            positions = unreset
+        visits = np.bincount(positions, minlength=nroffields)
+        # The jail field itself is visited before jumping
+        visits[self.board.jailfield] += nrofjumps
+        return visits, positions
+
+BITGENERATORS = ('PCG64', 'PCG64DXSM', 'Philox')
+
+def makerng(seed=None, bitgenerator='PCG64'):
+    """Returns a NumPy generator on the named bit generator, seed is None, an int or a SeedSequence"""
+    if bitgenerator not in BITGENERATORS:
+        raise ValueError('Unknown bit generator \'{}\''.format(bitgenerator))
+    return np.random.Generator(getattr(np.random, bitgenerator)(seed))
+
+def createengine(board, rng=None):
+    """Returns the vectorized engine for the rules of the board"""
+    if board.rules == 'full':
+        return RulesEngine(board, rng=rng)
+    return BatchEngine(board, rng=rng)
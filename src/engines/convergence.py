@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017-2023 Denis Meyer
+#
+# This file is part of the monopoly probabilities application.
+#
+
+"""Monopoly Probabilities - Convergence"""
+
+import numpy as np
+
+class BatchMeans:
+    """Streaming batch-means estimate of the per-field standard errors
+
+    The correlated chain is cut into consecutive batches of at least batchsize rolls.
+    The field frequencies of the batches are nearly independent, so the variance of
+    their mean estimates the variance of the overall probabilities.
+    """
+
+    def __init__(self, nroffields, batchsize=100000, minbatches=10):
+        self.batchsize = batchsize
+        self.minbatches = minbatches
+        self.nrofbatches = 0
+        self.lastrolls = 0
+        self.lastvisits = np.zeros(nroffields)
+        self.mean = np.zeros(nroffields)
+        self.m2 = np.zeros(nroffields)
+
+    def reset(self, nrofrolls, visits):
+        """Starts the next batch at the given counters without adding a batch"""
+        self.lastrolls = nrofrolls
+        self.lastvisits = np.array(visits, dtype=np.float64)
+
+    def update(self, nrofrolls, visits):
+        """Adds a batch if at least batchsize rolls happened since the last one"""
+        if nrofrolls - self.lastrolls < self.batchsize:
+            return
+        visits = np.array(visits, dtype=np.float64)
+        frequencies = (visits - self.lastvisits) / (nrofrolls - self.lastrolls)
+        # Welford's online update
+        self.nrofbatches += 1
+        delta = frequencies - self.mean
+        self.mean += delta / self.nrofbatches
+        self.m2 += delta * (frequencies - self.mean)
+        self.lastrolls = nrofrolls
+        self.lastvisits = visits
+
+    def standarderrors(self):
+        """Returns the standard error of every field probability, infinite until two batches exist"""
+        if self.nrofbatches < 2:
+            return np.full(len(self.mean), np.inf)
+        return np.sqrt(self.m2 / (self.nrofbatches - 1) / self.nrofbatches)
+
+    def halfwidths(self, z=1.96):
+        """Returns the confidence interval half-width of every field probability"""
+        return z * self.standarderrors()
+
+    def converged(self, tolerance, z=1.96):
+        """Returns whether every confidence interval half-width is below the tolerance"""
+        return self.nrofbatches >= self.minbatches and bool(np.all(self.halfwidths(z) < tolerance))
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017-2023 Denis Meyer
+#
+# This file is part of the monopoly probabilities application.
+#
+
+"""Monopoly Probabilities - Estimators"""
+
+import numpy as np
+
+from engines.batch import BatchEngine
+from engines.markov import MarkovChain
+
+# frequency:   visits per roll, the estimator of Game.getprobability
+# conditional: expected visits of the next roll from every position, i.e. the whole
+#              dice distribution per step instead of the rolled sample (Rao-Blackwell)
+# antithetic:  mean of the chain and of a second chain on the mirrored dice
+# control:     frequency corrected by the deviation of the rolled dice sums from their
+#              exact distribution, with regression coefficients fitted over the batches
+ESTIMATORS = ('frequency', 'conditional', 'antithetic', 'control')
+
+class Estimators:
+    """Estimates the field probabilities with several estimators from the same dice
+
+    The rolls are cut into batches, every estimator yields one estimate per batch.
+    The standard errors are the batch-means standard errors of these estimates.
+    """
+
+    def __init__(self, board, rng=None, batchsize=100000):
+        if board.rules != 'simple':
+            raise ValueError('The estimators need the simple rules')
+        self.board = board
+        self.batchsize = batchsize
+        self.engine = BatchEngine(board, rng=rng)
+        markovchain = MarkovChain(board)
+        self.expectedvisits = markovchain.visits
+        self.sumdistribution = markovchain.dicedistribution()
+        # One of the possible sums is left out, the sum frequencies add up to one
+        self.controls = np.flatnonzero(self.sumdistribution)[:-1]
+        self.positions = [0, 0]
+        self.batches = {name: [] for name in ESTIMATORS}
+        self.sums = []
+
+    @property
+    def nrofrolls(self):
+        """Returns the number of rolls of the main chain"""
+        return len(self.sums) * self.batchsize
+
+    def roll(self, nrofrolls):
+        """Rolls at least nrofrolls times, in whole batches"""
+        board = self.board
+        for _ in range(-(-nrofrolls // self.batchsize)):
+            dice = self.engine.rng.integers(board.dicemin, board.dicemax + 1, size=(self.batchsize, board.nrofdice))
+            visits, positions = self.engine.move(self.positions[0], dice)
+            before = np.concatenate(([self.positions[0]], positions[:-1]))
+            mirroredvisits, mirroredpositions = self.engine.move(self.positions[1], board.dicemin + board.dicemax - dice)
+            self.positions = [int(positions[-1]), int(mirroredpositions[-1])]
+            frequencies = visits / self.batchsize
+            self.batches['frequency'].append(frequencies)
+            self.batches['conditional'].append(np.bincount(before, minlength=board.nroffields)
+                                               @ self.expectedvisits / self.batchsize)
+            self.batches['antithetic'].append((visits + mirroredvisits) / (2 * self.batchsize))
+            self.sums.append(np.bincount(dice.sum(axis=1), minlength=len(self.sumdistribution)) / self.batchsize)
+
+    def _estimates(self, estimator):
+        """Returns the per batch estimates of an estimator and the degrees of freedom lost to fitting"""
+        if estimator not in ESTIMATORS:
+            raise ValueError('Unknown estimator \'{}\''.format(estimator))
+        if estimator != 'control':
+            return np.array(self.batches[estimator]), 0
+        frequencies = np.array(self.batches['frequency'])
+        deviations = np.array(self.sums)[:, self.controls] - self.sumdistribution[self.controls]
+        if len(deviations) <= len(self.controls) + 1:
+            return frequencies, 0
+        # Least squares fit of the frequencies on the deviations, their expectation is exactly zero
+        centered = deviations - deviations.mean(axis=0)
+        coefficients = np.linalg.lstsq(centered, frequencies - frequencies.mean(axis=0), rcond=None)[0]
+        return frequencies - deviations @ coefficients, len(self.controls)
+
+    def getprobabilities(self, estimator):
+        """Returns the estimated probabilities of all fields"""
+        estimates, _ = self._estimates(estimator)
+        if not len(estimates):
+            return np.zeros(self.board.nroffields)
+        return estimates.mean(axis=0)
+
+    def getstandarderrors(self, estimator):
+        """Returns the standard errors of the estimated probabilities, infinite until enough batches exist"""
+        estimates, fitted = self._estimates(estimator)
+        if len(estimates) - fitted < 2:
+            return np.full(self.board.nroffields, np.inf)
+        return np.sqrt(estimates.var(axis=0, ddof=1 + fitted) / len(estimates))
+
+    def compare(self):
+        """Returns the mean variance, the rolls used and the efficiency relative to the frequency estimator
+
+        The antithetic estimator moves two chains per roll, its efficiency accounts for that.
+        """
+        result = {}
+        baseline = np.mean(self.getstandarderrors('frequency') ** 2)
+        for estimator in ESTIMATORS:
+            variance = float(np.mean(self.getstandarderrors(estimator) ** 2))
+            rolls = self.nrofrolls * (2 if estimator == 'antithetic' else 1)
+            efficiency = float(baseline * self.nrofrolls / (variance * rolls)) if np.isfinite(variance) and variance > 0 else None
+            result[estimator] = {'variance': variance if np.isfinite(variance) else None,
+                                 'rolls': rolls,
+                                 'efficiency': efficiency}
+        return result
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017-2023 Denis Meyer
+#
+# This file is part of the monopoly probabilities application.
+#
+
+"""Monopoly Probabilities - Hitting Times"""
+
+import numpy as np
+
+from engines.rules import compilerules
+
+# Analytics of this process, keyed by board hash
+_analytics = {}
+
+def hittingtimes(board):
+    """Returns the hitting time analytics of a board, solved once per board definition"""
+    boardhash = board.gethash()
+    if boardhash not in _analytics:
+        _analytics[boardhash] = HittingTimes(board)
+    return _analytics[boardhash]
+
+class HittingTimes:
+    """Expected turns until first landing on a field or a set of fields, and landing probabilities
+
+    For a target set the rolls that visit it are cut from the transition matrix of the
+    compiled rules. The remaining matrix Q gives the expected rolls to the first visit
+    through (I - Q)^-1, and, counting only the rolls that end a turn, the expected turns.
+    A turn is folded into one matrix K = (I - Q C)^-1 Q E, with C and E selecting the
+    states that continue and end the turn, so K^k holds the chance to miss the targets
+    for k turns. The solutions of all single fields are computed as one batch and kept,
+    those of other sets are kept per set.
+    """
+
+    def __init__(self, board):
+        self.board = board
+        self.table = compilerules(board)
+        nrofstates = self.table.nrofstates
+        nroffields = board.nroffields
+        # Turns start on a field without doubles rolled
+        self.starts = np.arange(nroffields) * self.table.nrofdoubles
+        self.rows = np.repeat(np.arange(nrofstates), self.table.nrofdraws)
+        self.nextstates = self.table.nextstates.astype(np.int64)
+        self.transitions = self.table.transitionmatrix()
+        self.turnends = self.table.turnends.astype(np.float64)
+        # A field visited twice by one roll is hit once
+        visitfields = self.table.visitfields.astype(np.int64)
+        for slot in range(1, visitfields.shape[1]):
+            duplicate = (visitfields[:, slot:slot + 1] == visitfields[:, :slot]).any(axis=1)
+            visitfields[duplicate, slot] = nroffields
+        self.visitfields = visitfields
+        self.single = None
+        self.sets = {}
+
+    def _missmatrices(self, hits):
+        """Returns the (targets, states, states) transition matrices of the rolls that miss the targets
+
+        hits is a (targets, rolls, slots) boolean array of the visited slots hitting the targets.
+        """
+        nrofstates = self.table.nrofstates
+        targets, rolls, slots = np.nonzero(hits)
+        keys = (targets * nrofstates + self.rows[rolls]) * nrofstates + self.nextstates[rolls]
+        hitting = np.bincount(keys, minlength=len(hits) * nrofstates * nrofstates)
+        hitting = hitting.reshape(len(hits), nrofstates, nrofstates) / self.table.nrofdraws
+        return self.transitions[None] - hitting
+
+    def _solve(self, missing):
+        """Returns the expected turns until the first hit and the turn matrices of a batch of targets"""
+        identity = np.eye(self.table.nrofstates)
+        # Every roll that misses and ends a turn adds a turn, the hitting turn counts too
+        turns = 1 + np.linalg.solve(identity - missing, (missing @ self.turnends)[..., None])[..., 0]
+        turnmatrices = np.linalg.solve(identity - missing * (1 - self.turnends), missing * self.turnends)
+        return turns, turnmatrices
+
+    def _single(self):
+        """Returns the solutions of every single field as target, solved once"""
+        if self.single is None:
+            nroffields = self.board.nroffields
+            hits = self.visitfields[None] == np.arange(nroffields)[:, None, None]
+            self.single = self._solve(self._missmatrices(hits))
+        return self.single
+
+    def _set(self, fields):
+        """Returns the solution of a set of fields as target, solved once per set"""
+        key = frozenset(int(field) for field in fields)
+        if key not in self.sets:
+            hits = np.isin(self.visitfields, list(key))[None]
+            turns, turnmatrices = self._solve(self._missmatrices(hits))
+            self.sets[key] = (turns[0], turnmatrices[0])
+        return self.sets[key]
+
+    def hittingtimes(self):
+        """Returns the (start fields, target fields) matrix of the expected turns until first landing on the target"""
+        turns, _ = self._single()
+        return turns[:, self.starts].T
+
+    def expectedturns(self, fields):
+        """Returns the expected turns until first landing on any of the fields from every start field"""
+        turns, _ = self._set(fields)
+        return turns[self.starts]
+
+    def grouphittingtimes(self):
+        """Returns the expected turns until first landing on every color group, railroads and utilities"""
+        groups = {}
+        for street in self.board.streets:
+            groups.setdefault(street['group'], []).append(street['field'])
+        groups['railroad'] = self.board.railroads
+        groups['utility'] = self.board.utilities
+        return {group: self.expectedturns(fields) for group, fields in groups.items()}
+
+    def _landing(self, turnmatrices, turns):
+        """Returns the probabilities to land within 1 to turns turns for a batch of turn matrices"""
+        missing = np.ones(turnmatrices.shape[:2])
+        result = np.zeros((turns,) + missing.shape)
+        for turn in range(turns):
+            missing = (turnmatrices @ missing[..., None])[..., 0]
+            result[turn] = 1 - missing
+        return result
+
+    def landingprobabilities(self, turns):
+        """Returns the (turns, start fields, target fields) probabilities to land on the target within 1 to turns turns"""
+        _, turnmatrices = self._single()
+        return self._landing(turnmatrices, turns)[:, :, self.starts].transpose(0, 2, 1)
+
+    def landingprobability(self, fields, turns):
+        """Returns the (turns, start fields) probabilities to land on any of the fields within 1 to turns turns"""
+        _, turnmatrices = self._set(fields)
+        return self._landing(turnmatrices[None], turns)[:, 0, self.starts]
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017-2023 Denis Meyer
+#
+# This file is part of the monopoly probabilities application.
+#
+
+"""Monopoly Probabilities - Income"""
+
+import numpy as np
+
+from engines.markov import MarkovChain
+
+# Development levels: unimproved, whole group owned (streets pay double rent,
+# railroads and utilities pay the rent of owning all of them), 1-4 houses, hotel
+LEVELS = ['base', 'group', '1', '2', '3', '4', 'hotel']
+
+class IncomeAnalytics:
+    """Expected rent income and payback periods of every property and development level
+
+    The rents and investments are constant (properties, levels) matrices, the income is
+    the rent times the expected landings per opponent turn. Only the rows of properties
+    whose probability changed since the last update are recomputed.
+    """
+
+    def __init__(self, board, rollsperturn=None):
+        self.board = board
+        if rollsperturn is None:
+            rollsperturn = MarkovChain(board).rollsperturn() if board.rules == 'full' else 1.0
+        self.rollsperturn = rollsperturn
+        nroflevels = len(LEVELS)
+        streets = board.streets
+        self.fields = np.array([street['field'] for street in streets] + board.railroads + board.utilities, dtype=np.int64)
+        self.names = ([street['name'] for street in streets]
+                      + ['Railroad {}'.format(fieldno) for fieldno in board.railroads]
+                      + ['Utility {}'.format(fieldno) for fieldno in board.utilities])
+        self.groups = [street['group'] for street in streets] + ['railroad'] * len(board.railroads) + ['utility'] * len(board.utilities)
+        # Levels that do not exist for a property are NaN
+        self.rents = np.full((len(self.fields), nroflevels), np.nan)
+        self.costs = np.full((len(self.fields), nroflevels), np.nan)
+        for index, street in enumerate(streets):
+            rents = street['rents']
+            self.rents[index, :2] = [rents[0], 2 * rents[0]]
+            self.rents[index, 2:] = rents[1:]
+            self.costs[index] = street['price'] + street['housecost'] * np.array([0, 0, 1, 2, 3, 4, 5])
+        railroads = slice(len(streets), len(streets) + len(board.railroads))
+        self.rents[railroads, :2] = [board.railroadrents[0], board.railroadrents[-1]]
+        self.costs[railroads, :2] = board.railroadprice
+        # Utilities charge a multiple of the dice sum
+        dicesum = board.nrofdice * (board.dicemin + board.dicemax) / 2
+        utilities = slice(railroads.stop, None)
+        self.rents[utilities, :2] = [board.utilitymultipliers[0] * dicesum, board.utilitymultipliers[-1] * dicesum]
+        self.costs[utilities, :2] = board.utilityprice
+        self.probabilities = np.zeros(len(self.fields))
+        self.income = np.zeros((len(self.fields), nroflevels))
+        self.payback = np.full((len(self.fields), nroflevels), np.inf)
+        self.income[np.isnan(self.rents)] = np.nan
+        self.payback[np.isnan(self.rents)] = np.nan
+
+    def update(self, probabilities):
+        """Updates the income from the per roll visit probabilities of all fields, returns the updated rows"""
+        probabilities = np.asarray(probabilities, dtype=np.float64)[self.fields]
+        changed = np.flatnonzero(probabilities != self.probabilities)
+        if changed.size:
+            self.probabilities[changed] = probabilities[changed]
+            income = self.rents[changed] * (probabilities[changed] * self.rollsperturn)[:, None]
+            self.income[changed] = income
+            with np.errstate(divide='ignore', invalid='ignore'):
+                self.payback[changed] = np.where(income > 0, self.costs[changed] / income, np.inf)
+            self.payback[changed] = np.where(np.isnan(self.rents[changed]), np.nan, self.payback[changed])
+        return changed
+
+    def groupincome(self):
+        """Returns the summed expected income per opponent turn and the investment of every color group by level"""
+        groups = {}
+        for group in dict.fromkeys(self.groups):
+            rows = [index for index, name in enumerate(self.groups) if name == group]
+            groups[group] = (self.income[rows].sum(axis=0), self.costs[rows].sum(axis=0))
+        return groups
+
+    def best(self, level='hotel'):
+        """Returns the index of the property with the shortest payback period at a level, None if unknown"""
+        payback = self.payback[:, LEVELS.index(level)]
+        if not np.isfinite(payback).any():
+            return None
+        return int(np.nanargmin(np.where(np.isfinite(payback), payback, np.nan)))
+
+    def todict(self):
+        """Returns the analytics as JSON serializable data, unknown payback periods as None"""
+        def values(row):
+            return {level: (float(value) if np.isfinite(value) else None) for level, value in zip(LEVELS, row)}
+        return {
+            'rollsperturn': self.rollsperturn,
+            'properties': [{'field': int(fieldno),
+                            'name': name,
+                            'group': group,
+                            'income': values(income),
+                            'payback': values(payback)}
+                           for fieldno, name, group, income, payback
+                           in zip(self.fields, self.names, self.groups, self.income, self.payback)]
+        }
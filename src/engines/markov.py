@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017-2023 Denis Meyer
+#
+# This file is part of the monopoly probabilities application.
+#
+
+"""Monopoly Probabilities - Markov Chain"""
+
+import numpy as np
+
+from engines.rules import compilerules
+
+class MarkovChain:
+    """The exact field probabilities as the stationary distribution of the board's Markov chain
+
+    With the simple rules the states are the fields, with the full rules they are the
+    states of the compiled RulesTable (fields with doubles in a row, and jail turns).
+    """
+
+    def __init__(self, board):
+        self.board = board
+        if board.rules == 'full':
+            self.rulestable = compilerules(board)
+            self.transitions = self.rulestable.transitionmatrix()
+            self.visits = self.rulestable.visitmatrix()
+        else:
+            self.rulestable = None
+            self.transitions = self.transitionmatrix()
+            self.visits = self.visitmatrix()
+        self.probabilities = self._solve()
+
+    def dicedistribution(self):
+        """Returns the distribution of the sum of all dice, indexed by the sum"""
+        faces = np.ones(self.board.dicemax + 1)
+        faces[:self.board.dicemin] = 0
+        faces /= faces.sum()
+        distribution = np.ones(1)
+        for _ in range(self.board.nrofdice):
+            distribution = np.convolve(distribution, faces)
+        return distribution
+
+    def movematrix(self):
+        """Returns the transition matrix of a plain dice move without any jumps"""
+        nroffields = self.board.nroffields
+        matrix = np.zeros((nroffields, nroffields))
+        fields = np.arange(nroffields)
+        for steps, probability in enumerate(self.dicedistribution()):
+            matrix[fields, (fields + steps) % nroffields] += probability
+        return matrix
+
+    def transitionmatrix(self):
+        """Returns the transition matrix between the resting positions after each roll"""
+        matrix = self.movematrix()
+        jailfield = self.board.jailfield
+        if jailfield != self.board.jailposition:
+            matrix[:, self.board.jailposition] += matrix[:, jailfield]
+            matrix[:, jailfield] = 0
+        return matrix
+
+    def visitmatrix(self):
+        """Returns the expected visits of every field per roll from every resting position"""
+        matrix = self.movematrix()
+        # The jail field is visited before jumping
+        matrix[:, self.board.jailposition] += matrix[:, self.board.jailfield]
+        return matrix
+
+    def stationary(self):
+        """Returns the stationary distribution of the states"""
+        nrofstates = len(self.transitions)
+        system = self.transitions.T - np.eye(nrofstates)
+        system[-1, :] = 1
+        rhs = np.zeros(nrofstates)
+        rhs[-1] = 1
+        return np.linalg.solve(system, rhs)
+
+    def _solve(self):
+        """Returns the expected visits per roll, counted the same way as the simulation"""
+        self.distribution = self.stationary()
+        return self.distribution @ self.visits
+
+    def rollsperturn(self):
+        """Returns the expected number of rolls per turn, more than one with doubles"""
+        if not self.rulestable:
+            return 1.0
+        return 1 / self.distribution[self.rulestable.turnends].sum()
+
+    def getprobability(self, fieldno):
+        """Returns the probability of a specified field"""
+        if fieldno < 0 or fieldno >= self.board.nroffields:
+            return 0
+        return self.probabilities[fieldno]
+
+    def geterror(self, probabilities):
+        """Returns the maximum absolute deviation of the given probabilities from the exact ones"""
+        return float(np.max(np.abs(np.asarray(probabilities) - self.probabilities)))
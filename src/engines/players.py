@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017-2023 Denis Meyer
+#
+# This file is part of the monopoly probabilities application.
+#
+
+"""Monopoly Probabilities - Players"""
+
+import numpy as np
+
+from engines.rules import compilerules
+
+class MultiPlayerGame:
+    """Many games of several players each, played in lockstep
+
+    The player state lives in one (players, games) array of compiled rule states,
+    which encode the position, the doubles in a row and the jail turn. Players take
+    their turns in order; a turn continues while doubles are rolled.
+    """
+
+    def __init__(self, board, nrofplayers=4, nrofgames=100000, rng=None):
+        self.board = board
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.table = compilerules(board)
+        states = np.arange(self.table.nrofstates)
+        injail = states >= self.table.nroffreestates
+        self.turnends = self.table.turnends
+        self.statedoubles = np.where(injail, 0, states % self.table.nrofdoubles)
+        self.statejailturns = np.where(injail, states - self.table.nroffreestates + 1, 0)
+        self.states = np.zeros((nrofplayers, nrofgames), dtype=np.int64)
+        self.visits = np.zeros((nrofplayers, board.nroffields), dtype=np.int64)
+        self.nrofrolls = np.zeros(nrofplayers, dtype=np.int64)
+        self.nrofrounds = 0
+
+    @property
+    def positions(self):
+        """Returns the (players, games) positions"""
+        return self.table.positions[self.states]
+
+    @property
+    def doubles(self):
+        """Returns the (players, games) doubles rolled in a row"""
+        return self.statedoubles[self.states]
+
+    @property
+    def jailturns(self):
+        """Returns the (players, games) turns spent in jail, 0 if not in jail"""
+        return self.statejailturns[self.states]
+
+    def _turn(self, player):
+        """Plays one turn of a player in all games"""
+        nroffields = self.board.nroffields
+        nrofdraws = self.table.nrofdraws
+        states = self.states[player] # contiguous row, updated in place
+        rolling = np.arange(len(states))
+        while rolling.size:
+            index = states[rolling] * nrofdraws + self.rng.integers(0, nrofdraws, size=rolling.size)
+            self.visits[player] += np.bincount(self.table.visitfields[index].reshape(-1),
+                                               minlength=nroffields + 1)[:nroffields]
+            self.nrofrolls[player] += rolling.size
+            states[rolling] = self.table.nextstates[index]
+            rolling = rolling[~self.turnends[states[rolling]]]
+
+    def play(self, nrofrounds=1):
+        """Plays nrofrounds rounds, every player takes one turn per round"""
+        for _ in range(nrofrounds):
+            for player in range(len(self.states)):
+                self._turn(player)
+            self.nrofrounds += 1
+
+    def getprobabilities(self):
+        """Returns the (players, fields) visit probabilities per roll of every player"""
+        return self.visits / np.maximum(self.nrofrolls, 1)[:, None]
+
+    def getaggregateprobabilities(self):
+        """Returns the visit probabilities per roll of all players together"""
+        return self.visits.sum(axis=0) / max(int(self.nrofrolls.sum()), 1)
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017-2023 Denis Meyer
+#
+# This file is part of the monopoly probabilities application.
+#
+
+"""Monopoly Probabilities - Replay"""
+
+import mmap
+import numpy as np
+
+from data.trajectory import BLOCK, HEADER, MAGIC, SEGMENT, VERSION, decodeblock
+
+def _addcounts(histogram, values):
+    """Returns the histogram with the counts of the values added, grown as needed"""
+    counts = np.bincount(values)
+    if len(counts) > len(histogram):
+        histogram = np.concatenate((histogram, np.zeros(len(counts) - len(histogram), dtype=np.int64)))
+    histogram[:len(counts)] += counts
+    return histogram
+
+class Replay:
+    """Statistics of a recorded trajectory, computed block by block without simulating
+
+    The file is memory-mapped, uncompressed blocks are read without copying.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, self.nroffields, self.nrofdice, self.dicemin, self.dicemax,
+         self.compressed, self.jailfield, self.jailposition, self.startposition) = HEADER.unpack_from(self.map)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('Not a trajectory file (version {}): {}'.format(VERSION, path))
+        # (offset, rolls, length) of every complete block, 0 rolls for segment markers
+        self.blocks = []
+        # (rolls of the game, start position) of every segment
+        self.segments = []
+        offset = HEADER.size
+        while offset + BLOCK.size <= len(self.map):
+            nrofrolls, length = BLOCK.unpack_from(self.map, offset)
+            if offset + BLOCK.size + length > len(self.map):
+                break # partly written last block
+            self.blocks.append((offset + BLOCK.size, nrofrolls, length))
+            if nrofrolls == 0:
+                self.segments.append(SEGMENT.unpack_from(self.map, offset + BLOCK.size))
+            offset += BLOCK.size + length
+        self.nrofrolls = sum(nrofrolls for _, nrofrolls, _ in self.blocks)
+
+    def iterblocks(self):
+        """Yields the (rolls, dice) array, the positions before and the positions after every roll of each block"""
+        lastposition = self.startposition
+        for offset, nrofrolls, length in self.blocks:
+            if nrofrolls == 0:
+                _, lastposition = SEGMENT.unpack_from(self.map, offset)
+                continue
+            payload = memoryview(self.map)[offset:offset + length]
+            dice, positions = decodeblock(payload, nrofrolls, self.nrofdice, self.dicemin, self.compressed)
+            before = np.empty(nrofrolls, dtype=np.uint8)
+            before[0] = lastposition
+            before[1:] = positions[:-1]
+            lastposition = positions[-1]
+            yield dice, before, positions
+
+    def landed(self, dice, before):
+        """Returns the field every roll of a block landed on, before a jump to jail"""
+        return (before.astype(np.int64) + dice.sum(axis=1, dtype=np.int64)) % self.nroffields
+
+    def visits(self):
+        """Returns the visits of every field, counted the same way as the simulation"""
+        visits = np.zeros(self.nroffields, dtype=np.int64)
+        for dice, before, positions in self.iterblocks():
+            visits += np.bincount(positions, minlength=self.nroffields)
+            # The jail field itself is visited before jumping
+            visits[self.jailfield] += np.count_nonzero(self.landed(dice, before) == self.jailfield)
+        return visits
+
+    def transitioncounts(self):
+        """Returns the (fields, fields) matrix of the counts of moves from the row to the column field"""
+        counts = np.zeros(self.nroffields * self.nroffields, dtype=np.int64)
+        for _, before, positions in self.iterblocks():
+            counts += np.bincount(before.astype(np.int64) * self.nroffields + positions,
+                                  minlength=self.nroffields * self.nroffields)
+        return counts.reshape(self.nroffields, self.nroffields)
+
+    def runlengths(self, predicate):
+        """Returns the histogram of the lengths of consecutive rolls for which predicate is true
+
+        predicate is called with the dice, the positions before and after of a block and
+        returns a boolean mask. Runs continue across blocks.
+        """
+        histogram = np.zeros(1, dtype=np.int64)
+        carry = 0
+        for block in self.iterblocks():
+            mask = np.asarray(predicate(*block), dtype=np.int8)
+            edges = np.flatnonzero(np.diff(np.concatenate(([0], mask, [0]))))
+            starts = edges[0::2]
+            lengths = edges[1::2] - starts
+            if carry:
+                if starts.size and starts[0] == 0:
+                    lengths[0] += carry
+                else:
+                    histogram = _addcounts(histogram, [carry])
+            carry = 0
+            # A run reaching the end of the block may continue in the next one
+            if lengths.size and edges[-1] == len(mask):
+                carry = lengths[-1]
+                lengths = lengths[:-1]
+            histogram = _addcounts(histogram, lengths)
+        if carry:
+            histogram = _addcounts(histogram, [carry])
+        return histogram
+
+    def doublesstreaks(self):
+        """Returns the histogram of the lengths of runs of doubles"""
+        return self.runlengths(lambda dice, before, positions: (dice == dice[:, :1]).all(axis=1))
+
+    def jailintervals(self):
+        """Returns the histogram of the rolls from one roll sending the player to jail to the next one
+
+        A roll sends to jail if it lands on the jail field. Trajectories are recorded with
+        the simple rules only, a player leaves jail with the next roll, so instead of the
+        time spent in jail the intervals between being sent there are counted.
+        """
+        histogram = np.zeros(1, dtype=np.int64)
+        offset = 0
+        last = np.zeros(0, dtype=np.int64)
+        for dice, before, positions in self.iterblocks():
+            rolls = np.concatenate((last, offset + np.flatnonzero(self.landed(dice, before) == self.jailfield)))
+            histogram = _addcounts(histogram, np.diff(rolls))
+            last = rolls[-1:]
+            offset += len(before)
+        return histogram
+
+    def close(self):
+        """Unmaps the file"""
+        self.map.close()
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017-2023 Denis Meyer
+#
+# This file is part of the monopoly probabilities application.
+#
+
+"""Monopoly Probabilities - Rules"""
+
+import itertools
+import os
+import sys
+import numpy as np
+
+from data.constants import PATHS
+
+# Version of the compiled tables, increase whenever the compiler or the table layout changes
+RULES_VERSION = 2
+# Data types of the cached tables, part of the layout
+_DTYPES = {'nextstates': np.int16, 'visitfields': np.int16, 'positions': np.int64}
+
+# Compiled tables of this process, keyed by board hash
+_tables = {}
+
+def compilerules(board, cachedir=PATHS['cache']):
+    """Returns the compiled rules of a board, compiled once per board definition"""
+    boardhash = board.gethash()
+    if boardhash not in _tables:
+        _tables[boardhash] = RulesTable(board, cachedir=cachedir)
+    return _tables[boardhash]
+
+class RulesTable:
+    """The rules compiled into lookup arrays
+
+    A state is either a field together with the number of doubles rolled in a row,
+    or a jail turn. The simple rules have one state per field, without doubles or
+    cards. A draw is a dice combination together with one card of every deck, all
+    draws are equally likely. For every (state, draw) pair the tables hold the next
+    state and the visited fields, padded with nroffields.
+    """
+
+    def __init__(self, board, cachedir=None):
+        self.board = board
+        self.nroffields = board.nroffields
+        self.full = board.rules == 'full'
+        self.nrofdoubles = board.maxdoubles if self.full else 1
+        self.nrofjailturns = board.maxjailturns if self.full else 0
+        self.chancefields = board.chancefields if self.full else []
+        self.communitychestfields = board.communitychestfields if self.full else []
+        self.nroffreestates = board.nroffields * self.nrofdoubles
+        self.nrofstates = self.nroffreestates + self.nrofjailturns
+        faces = range(board.dicemin, board.dicemax + 1)
+        combinations = np.array(list(itertools.product(faces, repeat=board.nrofdice)))
+        self.dicesums = combinations.sum(axis=1)
+        self.dicedoubles = np.all(combinations == combinations[:, :1], axis=1)
+        self.chancecards = (board.chancecards if self.full else None) or [None]
+        self.communitychestcards = (board.communitychestcards if self.full else None) or [None]
+        self.nrofcards = len(self.chancecards) * len(self.communitychestcards)
+        self.nrofdraws = len(self.dicesums) * self.nrofcards
+        states = np.arange(self.nrofstates)
+        # States in which the player's turn is over, i.e. no doubles to roll again
+        self.turnends = (states >= self.nroffreestates) | (states % self.nrofdoubles == 0)
+        self._load(cachedir)
+
+    def _load(self, cachedir):
+        """Loads the tables from the cache directory, compiles and stores them if missing or outdated"""
+        path = os.path.join(cachedir, 'rules-v{}-{}.npz'.format(RULES_VERSION, self.board.gethash())) if cachedir else None
+        if path and os.path.exists(path):
+            try:
+                with np.load(path) as tables:
+                    if int(tables['version']) != RULES_VERSION:
+                        raise ValueError('Compiled rules of version {}'.format(int(tables['version'])))
+                    lengths = {'nextstates': self.nrofstates * self.nrofdraws,
+                               'visitfields': self.nrofstates * self.nrofdraws,
+                               'positions': self.nrofstates}
+                    for name, dtype in _DTYPES.items():
+                        if tables[name].dtype != dtype or len(tables[name]) != lengths[name]:
+                            raise ValueError('Unexpected layout of \'{}\''.format(name))
+                    self.nextstates = tables['nextstates']
+                    self.visitfields = tables['visitfields']
+                    self.positions = tables['positions']
+                return
+            except (OSError, ValueError, KeyError) as e:
+                print('Failed to load compiled rules from {}, compiling'.format(path), e, file=sys.stderr)
+        self._compile()
+        if path:
+            try:
+                os.makedirs(cachedir, exist_ok=True)
+                tmppath = '{}.{}.tmp'.format(path, os.getpid())
+                with open(tmppath, 'wb') as f:
+                    np.savez(f,
+                             version=np.array(RULES_VERSION),
+                             nextstates=self.nextstates,
+                             visitfields=self.visitfields,
+                             positions=self.positions)
+                os.replace(tmppath, path)
+            except OSError as e:
+                print('Failed to cache compiled rules to {}'.format(path), e, file=sys.stderr)
+
+    def _carddestination(self, field, card):
+        """Returns the destination of a card drawn on a field, None to stay or 'jail'"""
+        if card is None or card == 'jail':
+            return card
+        if card == 'back3':
+            return (field - 3) % self.nroffields
+        if card in ('railroad', 'utility'):
+            targets = self.board.railroads if card == 'railroad' else self.board.utilities
+            return min(targets, key=lambda target: (target - field - 1) % self.nroffields)
+        return card
+
+    def _resolve(self, field, chancecard, communitychestcard):
+        """Returns the visited fields and the final field, None if sent to jail, of landing on a field"""
+        visits = [field]
+        # A card may move onto another card field, the same draw is used again
+        for _ in range(3):
+            if field == self.board.jailfield:
+                return visits + [self.board.jailposition], None
+            if field in self.chancefields:
+                destination = self._carddestination(field, self.chancecards[chancecard])
+            elif field in self.communitychestfields:
+                destination = self._carddestination(field, self.communitychestcards[communitychestcard])
+            else:
+                return visits, field
+            if destination is None:
+                return visits, field
+            if destination == 'jail':
+                return visits + [self.board.jailposition], None
+            field = destination
+            visits.append(field)
+        return visits, field
+
+    def _compile(self):
+        """Compiles the next state and visited fields tables"""
+        nroffields = self.nroffields
+        nrofchestcards = len(self.communitychestcards)
+        landings = [[self._resolve(field, card // nrofchestcards, card % nrofchestcards)
+                     for card in range(self.nrofcards)]
+                    for field in range(nroffields)]
+        width = max(len(visits) for landing in landings for visits, _ in landing)
+        landvisits = np.full((nroffields, self.nrofcards, width), nroffields, dtype=np.int16)
+        landfields = np.zeros((nroffields, self.nrofcards), dtype=np.int64)
+        for field, landing in enumerate(landings):
+            for card, (visits, final) in enumerate(landing):
+                landvisits[field, card, :len(visits)] = visits
+                landfields[field, card] = -1 if final is None else final
+        jailstate = self.nroffreestates if self.nrofjailturns > 0 else self.board.jailposition * self.nrofdoubles
+        jailvisits = np.full(width, nroffields, dtype=np.int16)
+        jailvisits[0] = self.board.jailposition
+
+        nrofcombinations = len(self.dicesums)
+        nextstates = np.zeros((self.nrofstates, nrofcombinations, self.nrofcards), dtype=np.int16)
+        visitfields = np.zeros((self.nrofstates, nrofcombinations, self.nrofcards, width), dtype=np.int16)
+        self.positions = np.zeros(self.nrofstates, dtype=np.int64)
+        for state in range(self.nrofstates):
+            injail = state >= self.nroffreestates
+            if injail:
+                position, doubles, jailturn = self.board.jailposition, 0, state - self.nroffreestates
+            else:
+                position, doubles, jailturn = state // self.nrofdoubles, state % self.nrofdoubles, 0
+            self.positions[state] = position
+            for combination, (dicesum, isdouble) in enumerate(zip(self.dicesums, self.dicedoubles)):
+                if self.full and not injail and isdouble and doubles + 1 == self.nrofdoubles:
+                    # Too many doubles in a row
+                    nextstates[state, combination] = jailstate
+                    visitfields[state, combination] = jailvisits
+                    continue
+                if injail and not isdouble and jailturn + 1 < self.nrofjailturns:
+                    # Stay in jail
+                    nextstates[state, combination] = state + 1
+                    visitfields[state, combination] = jailvisits
+                    continue
+                # Leaving jail ends the turn, otherwise doubles allow another roll
+                nextdoubles = doubles + 1 if self.full and isdouble and not injail else 0
+                field = (position + dicesum) % nroffields
+                finals = landfields[field]
+                nextstates[state, combination] = np.where(finals < 0, jailstate, finals * self.nrofdoubles + nextdoubles)
+                visitfields[state, combination] = landvisits[field]
+        self.nextstates = nextstates.reshape(-1)
+        self.visitfields = visitfields.reshape(-1, width)
+
+    def transitionmatrix(self):
+        """Returns the transition matrix between the states"""
+        rows = np.repeat(np.arange(self.nrofstates), self.nrofdraws)
+        counts = np.bincount(rows * self.nrofstates + self.nextstates, minlength=self.nrofstates ** 2)
+        return counts.reshape(self.nrofstates, self.nrofstates) / self.nrofdraws
+
+    def visitmatrix(self):
+        """Returns the expected visits of every field per roll from every state"""
+        width = self.visitfields.shape[1]
+        rows = np.repeat(np.arange(self.nrofstates), self.nrofdraws * width)
+        counts = np.bincount(rows * (self.nroffields + 1) + self.visitfields.reshape(-1),
+                             minlength=self.nrofstates * (self.nroffields + 1))
+        return counts.reshape(self.nrofstates, self.nroffields + 1)[:, :-1] / self.nrofdraws
+
+class RulesEngine:
+    """Rolls the dice for many independent players in lockstep using the compiled rules
+
+    Every roll is a single table lookup, so all players advance with a few array operations.
+    """
+
+    def __init__(self, board, rng=None, nrofchains=4096):
+        self.board = board
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.table = compilerules(board)
+        self.states = np.zeros(nrofchains, dtype=np.int64)
+
+    def getstate(self):
+        """Returns the engine state as JSON serializable data"""
+        return {'bitgenerator': self.rng.bit_generator.state, 'states': self.states.tolist()}
+
+    def setstate(self, state):
+        """Restores the engine state"""
+        self.rng.bit_generator.state = state['bitgenerator']
+        self.states = np.array(state['states'], dtype=np.int64)
+
+    def roll(self, currposition, nrofrolls):
+        """Rolls the dice nrofrolls times in total, returns the visits and the position of the first player"""
+        nroffields = self.board.nroffields
+        nrofdraws = self.table.nrofdraws
+        visits = np.zeros(nroffields + 1, dtype=np.int64)
+        done = 0
+        while done < nrofrolls:
+            n = min(len(self.states), nrofrolls - done)
+            index = self.states[:n] * nrofdraws + self.rng.integers(0, nrofdraws, size=n)
+            visits += np.bincount(self.table.visitfields[index].reshape(-1), minlength=nroffields + 1)
+            self.states[:n] = self.table.nextstates[index]
+            done += n
+        return visits[:nroffields], int(self.table.positions[self.states[0]])
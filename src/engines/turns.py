@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017-2023 Denis Meyer
+#
+# This file is part of the monopoly probabilities application.
+#
+
+"""Monopoly Probabilities - Turns"""
+
+import numpy as np
+
+from engines.markov import MarkovChain
+
+class TurnDistribution:
+    """The distribution of the position after each of the first turns of a game starting on Go
+
+    With the simple rules a turn is a single roll. With the full rules a turn goes on while
+    doubles are rolled, it ends after a roll without doubles or when going to jail.
+    """
+
+    def __init__(self, board):
+        self.board = board
+        self.markovchain = MarkovChain(board)
+        rulestable = self.markovchain.rulestable
+        nrofstates = len(self.markovchain.transitions)
+        if rulestable:
+            self.positions = rulestable.positions
+            self.turnends = rulestable.turnends
+        else:
+            self.positions = np.arange(nrofstates)
+            self.turnends = np.ones(nrofstates, dtype=bool)
+
+    def exact(self, turns):
+        """Returns the (turns, fields) matrix of the position probabilities after every turn"""
+        transitions = self.markovchain.transitions
+        positions = np.zeros((len(transitions), self.board.nroffields))
+        positions[np.arange(len(transitions)), self.positions] = 1
+        distribution = np.zeros(len(transitions))
+        distribution[0] = 1
+        result = np.zeros((turns, self.board.nroffields))
+        for turn in range(turns):
+            ended = np.zeros(len(transitions))
+            rolling = distribution
+            # At most maxdoubles rolls per turn, the mass still rolling is exactly zero afterwards
+            while rolling.any():
+                rolling = rolling @ transitions
+                ended += np.where(self.turnends, rolling, 0)
+                rolling = np.where(self.turnends, 0, rolling)
+            distribution = ended
+            result[turn] = distribution @ positions
+        return result
+
+    def simulate(self, turns, nrofgames, rng=None):
+        """Returns the (turns, fields) matrix of the position frequencies of nrofgames games played in lockstep"""
+        rng = rng if rng is not None else np.random.default_rng()
+        rulestable = self.markovchain.rulestable
+        nroffields = self.board.nroffields
+        states = np.zeros(nrofgames, dtype=np.int64)
+        result = np.zeros((turns, nroffields))
+        for turn in range(turns):
+            if rulestable:
+                rolling = np.arange(nrofgames)
+                while rolling.size:
+                    index = states[rolling] * rulestable.nrofdraws + rng.integers(0, rulestable.nrofdraws, size=rolling.size)
+                    states[rolling] = rulestable.nextstates[index]
+                    rolling = rolling[~self.turnends[states[rolling]]]
+            else:
+                dice = rng.integers(self.board.dicemin, self.board.dicemax + 1, size=(nrofgames, self.board.nrofdice))
+                states = (states + dice.sum(axis=1)) % nroffields
+                states[states == self.board.jailfield] = self.board.jailposition
+            result[turn] = np.bincount(self.positions[states], minlength=nroffields) / nrofgames
+        return result
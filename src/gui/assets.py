@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017-2023 Denis Meyer
+#
+# This file is part of the monopoly probabilities application.
+#
+
+"""Monopoly Probabilities - Assets
+
+Renders the colorbar, the colormap lookup table and the resized images once and keeps them
+in the cache directory. matplotlib and PIL are only imported on a cache miss.
+"""
+
+import hashlib
+import json
+import os
+import os.path
+
+from data.constants import PATHS
+
+def _key(*parts):
+    """Returns a cache key for JSON serializable parts"""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode('utf-8')).hexdigest()[:32]
+
+def _matplotlib():
+    """Imports matplotlib with an offscreen backend, no GUI backend is needed for rendering"""
+    import matplotlib
+    matplotlib.use('Agg')
+    return matplotlib
+
+def _colormap(colormap):
+    """Returns a matplotlib colormap for a colormap name or a list of colors"""
+    _matplotlib()
+    import matplotlib.pyplot as plt
+    from matplotlib.colors import LinearSegmentedColormap
+    if isinstance(colormap, str):
+        return plt.get_cmap(colormap)
+    return LinearSegmentedColormap.from_list('', list(colormap))
+
+def _lut(cmap):
+    """Returns the colors of a matplotlib colormap as hex strings"""
+    import matplotlib.colors as clrs
+    return [clrs.to_hex(color) for color in cmap(range(cmap.N))]
+
+def _atomic(path, write):
+    """Calls write with a temporary path and moves the result to path"""
+    tmppath = '{}.{}.tmp.png'.format(path, os.getpid())
+    try:
+        write(tmppath)
+        os.replace(tmppath, path)
+    finally:
+        if os.path.exists(tmppath):
+            os.remove(tmppath)
+
+class AssetCache:
+    """Cache of the rendered GUI assets"""
+
+    def __init__(self, cachedir=PATHS['cache']):
+        self.cachedir = os.path.join(cachedir, 'assets')
+        os.makedirs(self.cachedir, exist_ok=True)
+
+    def _path(self, key, extension):
+        """Returns the path of a cache entry"""
+        return os.path.join(self.cachedir, '{}.{}'.format(key, extension))
+
+    def colormap(self, colormap, size=(400, 75)):
+        """Returns the colormap as list of hex colors and the path of the colorbar image
+
+        colormap is a matplotlib colormap name, a list of colors or a matplotlib colormap.
+        """
+        cmap = None
+        if not isinstance(colormap, (str, list, tuple)):
+            # A colormap object can only be keyed by its colors
+            cmap = colormap
+            colormap = _lut(cmap)
+        key = _key('colormap', colormap, size)
+        lutpath = self._path(key, 'json')
+        barpath = self._path(key, 'png')
+        if os.path.exists(lutpath) and os.path.exists(barpath):
+            with open(lutpath, 'r') as f:
+                return json.load(f), barpath
+        cmap = cmap or _colormap(colormap)
+        lut = _lut(cmap)
+        _atomic(barpath, lambda path: self._render_colorbar(cmap, path, size))
+        with open(lutpath + '.tmp', 'w') as f:
+            json.dump(lut, f)
+        os.replace(lutpath + '.tmp', lutpath)
+        print('Successfully written colormap to {}'.format(barpath))
+        return lut, barpath
+
+    def _render_colorbar(self, cmap, path, size):
+        """Renders the colorbar of a colormap"""
+        _matplotlib()
+        import pylab as pl
+        import numpy as np
+        from PIL import Image
+        a = np.array([[0,1]])
+        figure = pl.figure(figsize=(9, 1.5))
+        pl.imshow(a, cmap=cmap)
+        pl.gca().set_visible(False)
+        cax = pl.axes([0, 0.25, 0.75, 1])
+        pl.colorbar(orientation='horizontal', cax=cax)
+        pl.savefig(path, format='png')
+        pl.close(figure)
+        img = Image.open(path)
+        img = img.resize(size, Image.LANCZOS)
+        img.save(path, format='png')
+
+    def resized(self, sourcepath, size):
+        """Returns the path of a PNG of the source image resized to size"""
+        stat = os.stat(sourcepath)
+        path = self._path(_key('resized', os.path.abspath(sourcepath), stat.st_mtime_ns, size), 'png')
+        if not os.path.exists(path):
+            from PIL import Image
+            def write(tmppath):
+                img = Image.open(sourcepath)
+                img = img.resize(size, Image.LANCZOS)
+                img.save(tmppath, format='png')
+            _atomic(path, write)
+        return path
@@ -12,18 +12,19 @@ import os
 import os.path
 import sys
 import tkinter as tk
-import matplotlib.pyplot as plt
-import matplotlib.colors as clrs
 from tkinter import font
-from PIL import Image, ImageTk
-import pylab as pl
 import numpy as np
 
 from data.constants import COLORS
 from data.constants import FONTS
 from data.constants import SIZES
+from data.results import ResultStore
 from data.translations import Translations
+from engines.income import IncomeAnalytics, LEVELS
+from gui.assets import AssetCache
 from threads.game import Game
+from threads.parallelgame import ParallelGame
+from threads.sharedgame import SharedGame
 
 class MonopolyGUI(tk.Frame):
     """Main application GUI"""
@@ -31,46 +32,81 @@ class MonopolyGUI(tk.Frame):
     def __init__(self,
                  curr_workdir=os.getcwd(),
                  update_every_n_rounds=100000,
+                 refresh_rate=25,
                  sleep_after_round=0,
                  mapinterval=[0, 1],
-                 colormap=plt.get_cmap('coolwarm'),
+                 colormap='coolwarm',
+                 engine='scalar',
+                 rules='simple',
+                 nrofprocesses=1,
+                 checkpoint_path=None,
+                 checkpoint_interval=60,
+                 resume=False,
+                 tolerance=None,
+                 seed=None,
+                 cache=False,
+                 attach=None,
                  debug=False):
         tk.Frame.__init__(self)
         self.curr_workdir = curr_workdir
         self.translations = Translations()
         self.mapinterval = mapinterval
-        self.game = Game(callback_resumed=self.callback_resumed,
-                         callback_paused=self.callback_paused,
-                         callback_afterround=self.callback_afterround,
-                         afterround_n_rounds=update_every_n_rounds,
-                         afterround_sleep=sleep_after_round,
-                         mapinterval=self.mapinterval,
-                         debug=debug)
+        self.refresh_interval = max(1, int(1000 / refresh_rate))
+        self.lastsnapshot = None
+        # Set by the callbacks, the next frame redraws even without a new snapshot
+        self.dirty = False
+        # Last rendered label values and color indices per field, None redraws all
+        self.lastlabels = None
+        self.lastcolors = None
+        self.lastpayback = None
+        # A viewer only shows the counters of a game running elsewhere, e.g. headless.py --share
+        self.attach = attach
+        if attach:
+            self.game = SharedGame(attach,
+                                   callback_resumed=self.callback_resumed,
+                                   callback_paused=self.callback_paused,
+                                   mapinterval=self.mapinterval)
+        else:
+            gameargs = dict(callback_resumed=self.callback_resumed,
+                            callback_paused=self.callback_paused,
+                            afterround_n_rounds=update_every_n_rounds,
+                            afterround_sleep=sleep_after_round,
+                            mapinterval=self.mapinterval,
+                            engine=engine,
+                            rules=rules,
+                            checkpoint_path=checkpoint_path,
+                            checkpoint_interval=checkpoint_interval,
+                            resume=resume,
+                            tolerance=tolerance,
+                            seed=seed,
+                            resultstore=ResultStore() if cache else None,
+                            debug=debug)
+            if nrofprocesses > 1:
+                self.game = ParallelGame(nrofprocesses=nrofprocesses, **gameargs)
+            else:
+                self.game = Game(**gameargs)
+        self.income = IncomeAnalytics(self.game.board)
         self.colormap = colormap
+        self.assets = AssetCache()
         self.displaycolormap = self._create_colormap()
 
     def _create_colormap(self):
-        """Creates and saves a colormap"""
-        path = self.curr_workdir + '/assets/img/colorbar.png'
+        """Creates or loads the cached colormap colors and colorbar"""
+        self.colors = ['#000000']
+        self.colorbarpath = None
         # Yep, one huge try-catch-block... nothing important here
         try:
-            a = np.array([[0,1]])
-            pl.figure(figsize=(9, 1.5))
-            pl.imshow(a, cmap=self.colormap)
-            pl.gca().set_visible(False)
-            cax = pl.axes([0, 0.25, 0.75, 1])
-            pl.colorbar(orientation='horizontal', cax=cax)
-            pl.savefig(path)
-            print('Successfully written colormap to {}'.format(path))
+            self.colors, self.colorbarpath = self.assets.colormap(self.colormap)
             return True
         except Exception as e:
-            print('Failed to write colormap to {}'.format(path), e)
+            print('Failed to create colormap', e)
             return False
 
     def display(self):
         """Initializes the GUI and starts the main loop"""
         self._initgui()
         self.game.start()
+        self._poll_snapshot()
         self.mainloop()
 
     def _center(self):
@@ -90,25 +126,29 @@ class MonopolyGUI(tk.Frame):
 
     def callback_resumed(self):
         """Callback when simulation resumed"""
-        self._update_rounds_label()
-        self._update_streetprobabilities()
+        self.dirty = True
 
     def callback_paused(self):
         """Callback when simulation paused"""
-        self._update_rounds_label()
-        self._update_streetprobabilities()
+        self.dirty = True
 
-    def callback_afterround(self):
-        """Callback after every n simulation rounds"""
-        self._update_rounds_label()
-        self._update_streetprobabilities()
+    def _poll_snapshot(self):
+        """Redraws if the game published a new snapshot, runs at the refresh rate on the Tk main loop"""
+        if self.processing and self.game.converged:
+            self.processing = False
+            self._update_processing_text(self.processing)
+        snapshot = self.game.snapshot
+        if snapshot is not self.lastsnapshot or self.dirty:
+            self.lastsnapshot = snapshot
+            self.dirty = False
+            self._update_rounds_label()
+            self._update_streetprobabilities()
+        self.after(self.refresh_interval, self._poll_snapshot)
 
     def _draw_board(self):
         """Draws the canvas"""
         imagepath = self.curr_workdir + '/assets/img/board.png'
-        img = Image.open(imagepath)
-        img = img.resize((self.imgsize, self.imgsize), Image.ANTIALIAS)
-        self.img_board = ImageTk.PhotoImage(img)
+        self.img_board = tk.PhotoImage(file=self.assets.resized(imagepath, (self.imgsize, self.imgsize)))
         self.canvas.create_image(self.imgsize / 2 + self.pad,
                                  self.imgsize / 2 + self.pad,
                                  anchor=tk.CENTER,
@@ -119,10 +159,7 @@ class MonopolyGUI(tk.Frame):
                                                             anchor=tk.CENTER,
                                                             text=self.translations.get('GUI.LABELS.PROBABILITYCMAP'),
                                                             font=self.font_probcmaplabel)
-            imagepath = self.curr_workdir + '/assets/img/colorbar.png'
-            img = Image.open(imagepath)
-            img = img.resize((400, 75), Image.ANTIALIAS)
-            self.img_cmap = ImageTk.PhotoImage(img)
+            self.img_cmap = tk.PhotoImage(file=self.colorbarpath)
             self.canvas.create_image(self.imgsize / 2 + self.pad - 100,
                                      self.imgsize / 2 + self.pad + 200,
                                      anchor=tk.CENTER,
@@ -132,16 +169,24 @@ class MonopolyGUI(tk.Frame):
                                                           anchor=tk.CENTER,
                                                           text=self.translations.get('GUI.LABELS.STATUS'),
                                                           font=self.font_processinglabel)
+        status = self.translations.get('GUI.ACTIONS.CLICKTOSTART')
+        if self.attach:
+            status = self.translations.get('GUI.ACTIONS.VIEWING').format(self.attach)
         self.canvas_status = self.canvas.create_text(self.imgsize / 2 + self.pad + 100,
                                                      self.imgsize / 2 + self.pad - 250,
                                                      anchor=tk.CENTER,
-                                                     text=self.translations.get('GUI.ACTIONS.CLICKTOSTART'),
+                                                     text=status,
                                                      font=self.font_processingstatus)
         self.canvas_rounds = self.canvas.create_text(self.imgsize / 2 + self.pad + 100,
                                                      self.imgsize / 2 + self.pad + self.font_processingstatus_def['size'] - 250,
                                                      anchor=tk.CENTER,
                                                      text='',
                                                      font=self.font_roundslabel)
+        self.canvas_payback = self.canvas.create_text(self.imgsize / 2 + self.pad + 100,
+                                                      self.imgsize / 2 + self.pad + 2 * self.font_processingstatus_def['size'] - 250,
+                                                      anchor=tk.CENTER,
+                                                      text='',
+                                                      font=self.font_roundslabel)
 
     def _draw_rects(self):
         """Draws the rectangles"""
@@ -210,36 +255,36 @@ class MonopolyGUI(tk.Frame):
                                     width=3)
 
     def _update_streetprobabilities(self):
-        """Updates the street probabilities"""
+        """Updates the street probabilities whose label or color changed since the last frame"""
         str_label_prob = self.translations.get('GUI.LABELS.PROB')
-        # Probabilities South
-        for index, sb in enumerate(self.probs_s):
-            prob = self.game.getprobability(index)
-            prob_mapped = self.game.mapprobability(index)
-            self.canvas.itemconfig(sb,
-                                   text=str_label_prob.format(prob * 100),
-                                   fill=clrs.to_hex(self.colormap(prob_mapped)))
-        # Probabilities West
-        for index, sb in enumerate(self.probs_w):
-            prob = self.game.getprobability(index + 10)
-            prob_mapped = self.game.mapprobability(index + 10)
-            self.canvas.itemconfig(sb,
-                                   text=str_label_prob.format(prob * 100),
-                                   fill=clrs.to_hex(self.colormap(prob_mapped)))
-        # Probabilities North
-        for index, sb in enumerate(self.probs_n):
-            prob = self.game.getprobability(index + 20)
-            prob_mapped = self.game.mapprobability(index + 20)
-            self.canvas.itemconfig(sb,
-                                   text=str_label_prob.format(prob * 100),
-                                   fill=clrs.to_hex(self.colormap(prob_mapped)))
-        # Probabilities East
-        for index, sb in enumerate(self.probs_e):
-            prob = self.game.getprobability(index + 30)
-            prob_mapped = self.game.mapprobability(index + 30)
-            self.canvas.itemconfig(sb,
-                                   text=str_label_prob.format(prob * 100),
-                                   fill=clrs.to_hex(self.colormap(prob_mapped)))
+        _, probs, probs_mapped = self.game.getsnapshot()
+        # The labels show thousandths of a percent, the text is rendered from that integer
+        labels = np.rint(probs * 100000).astype(np.int64)
+        # Same lookup as a matplotlib colormap: [0, 1] onto the table, clipped outside
+        colors = np.clip((probs_mapped * len(self.colors)).astype(int), 0, len(self.colors) - 1)
+        if self.lastlabels is None:
+            changed = range(len(self.probitems))
+        else:
+            changed = np.flatnonzero((labels != self.lastlabels) | (colors != self.lastcolors))
+        for index in changed:
+            self.canvas.itemconfig(self.probitems[index],
+                                   text=str_label_prob.format(labels[index] / 1000),
+                                   fill=self.colors[colors[index]])
+        self.lastlabels = labels
+        self.lastcolors = colors
+        self._update_payback_label(probs)
+
+    def _update_payback_label(self, probs):
+        """Updates the income analytics and shows the property with the shortest hotel payback period"""
+        self.income.update(probs)
+        best = self.income.best('hotel')
+        text = ''
+        if best is not None:
+            text = self.translations.get('GUI.LABELS.BESTPAYBACK').format(self.income.names[best],
+                                                                         self.income.payback[best, LEVELS.index('hotel')])
+        if text != self.lastpayback:
+            self.canvas.itemconfig(self.canvas_payback, text=text)
+            self.lastpayback = text
 
     def _draw_streetprobabilities(self):
         """Draws the street probabilities"""
@@ -289,6 +334,11 @@ class MonopolyGUI(tk.Frame):
                                                         angle=90,
                                                         text='',
                                                         font=self.font_probslabel))
+        # Probabilities South, West, North and East, in field order
+        self.probitems = self.probs_s + self.probs_w + self.probs_n + self.probs_e
+        self.lastlabels = None
+        self.lastcolors = None
+        self.lastpayback = None
 
     def _draw_frame(self):
         """Draws the board frames"""
@@ -300,7 +350,7 @@ class MonopolyGUI(tk.Frame):
     def _update_rounds_label(self):
         """Updates the rounds text"""
         self.canvas.itemconfig(self.canvas_rounds,
-                               text=self.translations.get('GUI.LABELS.ROUNDS').format(self.game.nrofrolls))
+                               text=self.translations.get('GUI.LABELS.ROUNDS').format(self.game.snapshot[0]))
 
     def _update_processing_text(self, processing=False):
         """Updates the processing text"""
@@ -321,7 +371,9 @@ class MonopolyGUI(tk.Frame):
         #print('_button_mouse1_released: (x: {x}, y: {y})'.format(x=mousex, y=mousey))
 
     def _create_canvasbinding(self):
-        """Binds actions to the canvas"""
+        """Binds actions to the canvas, a viewer cannot control the game"""
+        if self.attach:
+            return
         self.canvas.bind('<ButtonRelease-1>', self._button_mouse1_released)
 
     def _create_canvas(self):
@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017-2023 Denis Meyer
+#
+# This file is part of the monopoly probabilities application.
+#
+
+"""Monopoly Probabilities - Headless
+
+Runs the simulation without any GUI and writes the probabilities as JSON or CSV.
+Imports nothing from Tk, matplotlib or PIL.
+"""
+
+import argparse
+import json
+import math
+import sys
+import time
+
+from data.board import Board, loadboard
+from data.results import ResultStore
+from engines.batch import BITGENERATORS, makerng
+from engines.estimators import ESTIMATORS, Estimators
+from engines.hitting import hittingtimes
+from engines.income import IncomeAnalytics, LEVELS
+from engines.markov import MarkovChain
+from engines.players import MultiPlayerGame
+from engines.turns import TurnDistribution
+from threads.game import Game
+from threads.parallelgame import ParallelGame
+
+def parse_args(args=None):
+    """Parses the command line arguments"""
+    parser = argparse.ArgumentParser(description='Simulates Monopoly field probabilities without a GUI')
+    parser.add_argument('--rolls', type=int, default=None, help='number of rolls to simulate')
+    parser.add_argument('--seconds', type=float, default=None, help='wall-clock budget in seconds')
+    parser.add_argument('--engine', choices=['scalar', 'batch'], default='batch', help='simulation engine')
+    parser.add_argument('--rules', choices=['simple', 'full'], default='simple', help='game rules')
+    parser.add_argument('--board', default=None, help='board definition file (JSON or TOML), overrides --rules')
+    parser.add_argument('--processes', type=int, default=1, help='number of worker processes')
+    parser.add_argument('--seed', type=int, default=None, help='random seed, results are identical for equal seeds')
+    parser.add_argument('--bitgenerator', choices=BITGENERATORS, default='PCG64', help='NumPy bit generator')
+    parser.add_argument('--tolerance', type=float, default=None,
+                        help='stop once every confidence interval half-width is below this probability')
+    parser.add_argument('--turns', type=int, default=None,
+                        help='instead of long-run probabilities, write the position distribution after each of the first turns')
+    parser.add_argument('--hitting', type=int, default=None,
+                        help='write the expected turns until first landing on every field and group and '
+                             'the probabilities to land within 1 to HITTING turns, computed exactly')
+    parser.add_argument('--players', type=int, default=None,
+                        help='instead of a single chain, play --rounds rounds of --games games with this many players')
+    parser.add_argument('--rounds', type=int, default=100, help='with --players, rounds to play')
+    parser.add_argument('--games', type=int, default=0,
+                        help='with --turns or --players, number of games played in lockstep, 0 for the exact distribution')
+    parser.add_argument('--exact', action='store_true',
+                        help='also write the exact probabilities of the Markov chain and the largest deviation from them')
+    parser.add_argument('--income', action='store_true',
+                        help='write the expected rent income and payback periods instead of the probabilities')
+    parser.add_argument('--estimator', choices=ESTIMATORS + ('all',), default=None,
+                        help='with --rolls and the simple rules, estimate with variance reduction and report the variances')
+    parser.add_argument('--batchsize', type=int, default=100000, help='with --estimator, rolls per batch')
+    parser.add_argument('--chunk', type=int, default=1000000, help='rolls between budget checks')
+    parser.add_argument('--checkpoint', default=None, help='checkpoint file, written periodically')
+    parser.add_argument('--checkpoint-interval', type=float, default=60, help='seconds between checkpoints')
+    parser.add_argument('--resume', action='store_true', help='continue from the checkpoint file if it exists')
+    parser.add_argument('--telemetry-port', type=int, default=None,
+                        help='serve Prometheus metrics on http://127.0.0.1:PORT/metrics')
+    parser.add_argument('--telemetry-output', default=None,
+                        help='append the metrics as JSON lines to a file or to tcp://HOST:PORT')
+    parser.add_argument('--telemetry-interval', type=float, default=1.0, help='seconds between metric updates')
+    parser.add_argument('--cache', action='store_true',
+                        help='continue the stored result of the same board, engine and seed (default seed 0)')
+    parser.add_argument('--cache-size', type=float, default=64, help='result store size in MB')
+    parser.add_argument('--share', default=None,
+                        help='publish the counters in the named shared memory block, see main.py --attach')
+    parser.add_argument('--record', default=None,
+                        help='record the dice and positions of every roll to a trajectory file, see replay.py')
+    parser.add_argument('--format', choices=['json', 'csv'], default='json', help='output format')
+    parser.add_argument('--output', default='-', help='output file, "-" for stdout')
+    parser.add_argument('--debug', action='store_true', help='print debug output')
+    args = parser.parse_args(args)
+    if args.rolls is None and args.seconds is None and args.tolerance is None and args.turns is None \
+       and args.players is None and args.hitting is None:
+        parser.error('at least one of --rolls, --seconds, --tolerance, --turns, --hitting or --players is required')
+    if args.players is not None and args.games <= 0:
+        parser.error('--players needs --games')
+    if args.estimator:
+        if args.rolls is None:
+            parser.error('--estimator needs --rolls')
+        rules = loadboard(args.board).rules if args.board else args.rules
+        if rules != 'simple':
+            parser.error('--estimator needs the simple rules, the board has the {} rules'.format(rules))
+    return args
+
+def simulate(rolls=None,
+             seconds=None,
+             engine='batch',
+             rules='simple',
+             boardfile=None,
+             processes=1,
+             chunk=1000000,
+             checkpoint_path=None,
+             checkpoint_interval=60,
+             resume=False,
+             tolerance=None,
+             seed=None,
+             bitgenerator='PCG64',
+             resultstore=None,
+             shared_name=None,
+             record_path=None,
+             telemetry_interval=1.0,
+             telemetry_port=None,
+             telemetry_output=None,
+             debug=False):
+    """Simulates until the roll or time budget is used up, returns the game"""
+    deadline = None if seconds is None else time.monotonic() + seconds
+    gameargs = dict(rules=rules,
+                    boardfile=boardfile,
+                    checkpoint_path=checkpoint_path,
+                    checkpoint_interval=checkpoint_interval,
+                    resume=resume,
+                    tolerance=tolerance,
+                    seed=seed,
+                    bitgenerator=bitgenerator,
+                    resultstore=resultstore,
+                    shared_name=shared_name,
+                    record_path=record_path,
+                    telemetry_interval=telemetry_interval,
+                    telemetry_port=telemetry_port,
+                    telemetry_output=telemetry_output,
+                    debug=debug)
+    if processes > 1:
+        game = ParallelGame(nrofprocesses=processes,
+                            rolls_per_message=chunk,
+                            afterround_n_rounds=chunk,
+                            **gameargs)
+    else:
+        game = Game(engine=engine, afterround_n_rounds=chunk, **gameargs)
+    remaining = None if rolls is None else rolls - game.nrofrolls
+    if remaining is None or remaining > 0:
+        seconds = None if deadline is None else max(deadline - time.monotonic(), 0)
+        game.submit(nrofrolls=remaining, seconds=seconds).result()
+    game.stop().result() # the game thread writes the final checkpoint
+    game.close()
+    return game
+
+def write(game, output, fmt='json', seconds=None, exact=None):
+    """Writes the probabilities of all fields, and the exact ones of a Markov chain if given"""
+    probabilities = [game.getprobability(fieldno) for fieldno in range(game.board.nroffields)]
+    standarderrors = [None if math.isinf(e) else float(e) for e in game.getstandarderrors()]
+    if fmt == 'csv':
+        output.write('field,visits,probability,standarderror' + (',exact' if exact else '') + '\n')
+        for fieldno, probability in enumerate(probabilities):
+            row = [fieldno, game.visits[fieldno], probability, standarderrors[fieldno]]
+            if exact:
+                row.append(float(exact.getprobability(fieldno)))
+            output.write(','.join(str(value) for value in row) + '\n')
+    else:
+        result = {'rolls': game.nrofrolls,
+                  'seconds': seconds,
+                  'seed': game.seed,
+                  'visits': [int(v) for v in game.visits],
+                  'converged': game.converged,
+                  'probabilities': probabilities,
+                  'standarderrors': standarderrors}
+        if exact:
+            result.update(exact=exact.probabilities.tolist(), error=exact.geterror(probabilities))
+        json.dump(result, output)
+        output.write('\n')
+
+def writeincome(analytics, output, fmt='json'):
+    """Writes the expected income per opponent turn and the payback period of every property and level"""
+    if fmt == 'csv':
+        output.write('field,name,group,level,income,payback\n')
+        for item in analytics.todict()['properties']:
+            for level in LEVELS:
+                output.write('{},{},{},{},{},{}\n'.format(item['field'], item['name'], item['group'], level,
+                                                        item['income'][level], item['payback'][level]))
+    else:
+        json.dump(analytics.todict(), output)
+        output.write('\n')
+
+def writeestimators(estimators, names, output, fmt='json'):
+    """Writes the probabilities and standard errors of the estimators and how they compare"""
+    comparison = estimators.compare()
+    if fmt == 'csv':
+        output.write(','.join(['field'] + ['{}{}'.format(name, column) for name in names
+                                           for column in ('', '_standarderror')]) + '\n')
+        columns = [(estimators.getprobabilities(name), estimators.getstandarderrors(name)) for name in names]
+        for fieldno in range(estimators.board.nroffields):
+            output.write(','.join([str(fieldno)] + ['{},{}'.format(probabilities[fieldno], standarderrors[fieldno])
+                                                    for probabilities, standarderrors in columns]) + '\n')
+    else:
+        json.dump({'rolls': estimators.nrofrolls,
+                   'batchsize': estimators.batchsize,
+                   'estimators': {name: dict(comparison[name],
+                                             probabilities=estimators.getprobabilities(name).tolist(),
+                                             standarderrors=[None if math.isinf(e) else float(e)
+                                                             for e in estimators.getstandarderrors(name)])
+                                  for name in names}},
+                  output)
+        output.write('\n')
+
+def writehitting(analytics, turns, output, fmt='json'):
+    """Writes the expected turns until first landing and the landing probabilities of every start and target field"""
+    hittingtimes = analytics.hittingtimes()
+    landing = analytics.landingprobabilities(turns)
+    if fmt == 'csv':
+        output.write(','.join(['start', 'target', 'turns'] + ['within{}'.format(turn + 1) for turn in range(turns)]) + '\n')
+        for start, row in enumerate(hittingtimes):
+            for target, expected in enumerate(row):
+                output.write(','.join([str(start), str(target), str(expected)]
+                                      + [str(p) for p in landing[:, start, target]]) + '\n')
+    else:
+        json.dump({'hittingtimes': hittingtimes.tolist(),
+                   'groups': {group: times.tolist() for group, times in analytics.grouphittingtimes().items()},
+                   'landing': landing.tolist()},
+                  output)
+        output.write('\n')
+
+def writeturns(distribution, output, fmt='json'):
+    """Writes the (turns, fields) position distribution"""
+    if fmt == 'csv':
+        output.write(','.join(['turn'] + ['p{}'.format(fieldno) for fieldno in range(distribution.shape[1])]) + '\n')
+        for turn, probabilities in enumerate(distribution):
+            output.write(','.join([str(turn + 1)] + [str(p) for p in probabilities]) + '\n')
+    else:
+        json.dump({'turns': len(distribution), 'distribution': distribution.tolist()}, output)
+        output.write('\n')
+
+def writeplayers(game, output, fmt='json'):
+    """Writes the per player and the aggregate visit probabilities"""
+    probabilities = game.getprobabilities()
+    aggregate = game.getaggregateprobabilities()
+    if fmt == 'csv':
+        output.write(','.join(['player', 'rolls'] + ['p{}'.format(fieldno) for fieldno in range(len(aggregate))]) + '\n')
+        for player, playerprobabilities in enumerate(probabilities):
+            output.write(','.join([str(player + 1), str(game.nrofrolls[player])]
+                                  + [str(p) for p in playerprobabilities]) + '\n')
+        output.write(','.join(['all', str(game.nrofrolls.sum())] + [str(p) for p in aggregate]) + '\n')
+    else:
+        json.dump({'players': len(probabilities),
+                   'games': game.states.shape[1],
+                   'rounds': game.nrofrounds,
+                   'rolls': game.nrofrolls.tolist(),
+                   'visits': game.visits.tolist(),
+                   'probabilities': probabilities.tolist(),
+                   'aggregate': aggregate.tolist()},
+                  output)
+        output.write('\n')
+
+def _write(path, writer):
+    """Calls writer with the output file or stdout"""
+    if path == '-':
+        writer(sys.stdout)
+    else:
+        with open(path, 'w') as output:
+            writer(output)
+
+def main(args=None):
+    """Runs the headless simulation"""
+    args = parse_args(args)
+    board = loadboard(args.board) if args.board else Board(args.rules)
+    if args.players:
+        game = MultiPlayerGame(board, nrofplayers=args.players, nrofgames=args.games,
+                               rng=makerng(args.seed, args.bitgenerator))
+        game.play(args.rounds)
+        _write(args.output, lambda output: writeplayers(game, output, args.format))
+        return
+    if args.estimator:
+        estimators = Estimators(board, rng=makerng(args.seed, args.bitgenerator), batchsize=args.batchsize)
+        estimators.roll(args.rolls)
+        names = ESTIMATORS if args.estimator == 'all' else (args.estimator,)
+        _write(args.output, lambda output: writeestimators(estimators, names, output, args.format))
+        return
+    if args.hitting:
+        _write(args.output, lambda output: writehitting(hittingtimes(board), args.hitting, output, args.format))
+        return
+    if args.turns:
+        turns = TurnDistribution(board)
+        if args.games > 0:
+            distribution = turns.simulate(args.turns, args.games, rng=makerng(args.seed, args.bitgenerator))
+        else:
+            distribution = turns.exact(args.turns)
+        _write(args.output, lambda output: writeturns(distribution, output, args.format))
+        return
+    start = time.monotonic()
+    game = simulate(rolls=args.rolls,
+                    seconds=args.seconds,
+                    engine=args.engine,
+                    rules=args.rules,
+                    boardfile=args.board,
+                    processes=args.processes,
+                    chunk=args.chunk,
+                    checkpoint_path=args.checkpoint,
+                    checkpoint_interval=args.checkpoint_interval,
+                    resume=args.resume,
+                    tolerance=args.tolerance,
+                    seed=args.seed,
+                    bitgenerator=args.bitgenerator,
+                    resultstore=ResultStore(maxbytes=int(args.cache_size * 1024 * 1024)) if args.cache else None,
+                    shared_name=args.share,
+                    record_path=args.record,
+                    telemetry_interval=args.telemetry_interval,
+                    telemetry_port=args.telemetry_port,
+                    telemetry_output=args.telemetry_output,
+                    debug=args.debug)
+    elapsed = time.monotonic() - start
+    if args.income:
+        analytics = IncomeAnalytics(game.board)
+        analytics.update([game.getprobability(fieldno) for fieldno in range(game.board.nroffields)])
+        _write(args.output, lambda output: writeincome(analytics, output, args.format))
+        return
+    exact = MarkovChain(game.board) if args.exact else None
+    _write(args.output, lambda output: write(game, output, args.format, elapsed, exact))
+
+if __name__ == '__main__':
+    main()
@@ -8,21 +8,26 @@
 
 """Monopoly Probabilities - Main"""
 
+import argparse
 import os
-import matplotlib
-matplotlib.use('TkAgg') # fix macOS crash
-from matplotlib.colors import LinearSegmentedColormap
 
 from gui.gui import MonopolyGUI
 
-from sys import platform as sys_pf
-
 if __name__ == '__main__':
-    cmap = LinearSegmentedColormap.from_list('', ['blue', 'red']) #['#a6bddb', '#f03b20']
+    parser = argparse.ArgumentParser(description='Shows the Monopoly probabilities')
+    parser.add_argument('--attach', default=None,
+                        help='show the shared counters of a running headless.py --share NAME instead of simulating')
+    args = parser.parse_args()
     gui = MonopolyGUI(curr_workdir=os.getcwd(),
                       update_every_n_rounds=100000,
+                      refresh_rate=25,
                       sleep_after_round=0,
                       mapinterval=[0, 10],
-                      colormap=cmap, #plt.get_cmap('coolwarm'),
+                      colormap=['blue', 'red'], # or e.g. ['#a6bddb', '#f03b20'] or 'coolwarm'
+                      engine='batch', # 'scalar' or 'batch'
+                      rules='simple', # 'simple' or 'full' (needs the batch engine)
+                      nrofprocesses=1, # > 1 simulates in worker processes
+                      cache=True, # continue the stored result of the same board, engine and seed
+                      attach=args.attach,
                       debug=False)
     gui.display()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017-2023 Denis Meyer
+#
+# This file is part of the monopoly probabilities application.
+#
+
+"""Monopoly Probabilities - Replay
+
+Computes statistics of a trajectory recorded with headless.py --record as JSON.
+"""
+
+import argparse
+import json
+import sys
+
+from engines.replay import Replay
+
+STATISTICS = ('visits', 'transitions', 'doubles', 'jail')
+
+def analyze(path, statistics=STATISTICS):
+    """Returns the requested statistics of a trajectory file"""
+    replay = Replay(path)
+    result = {'rolls': replay.nrofrolls,
+              'segments': [{'rolls': rolls, 'startposition': position} for rolls, position in replay.segments]}
+    if 'visits' in statistics:
+        visits = replay.visits()
+        result['visits'] = visits.tolist()
+        result['probabilities'] = (visits / max(replay.nrofrolls, 1)).tolist()
+    if 'transitions' in statistics:
+        result['transitions'] = replay.transitioncounts().tolist()
+    if 'doubles' in statistics:
+        result['doublesstreaks'] = replay.doublesstreaks().tolist()
+    if 'jail' in statistics:
+        result['jailintervals'] = replay.jailintervals().tolist()
+    replay.close()
+    return result
+
+def main(args=None):
+    """Analyzes a trajectory"""
+    parser = argparse.ArgumentParser(description='Analyzes a recorded Monopoly trajectory')
+    parser.add_argument('trajectory', help='trajectory file')
+    parser.add_argument('--statistics', nargs='*', choices=STATISTICS, default=list(STATISTICS),
+                        help='statistics to compute')
+    parser.add_argument('--output', default='-', help='JSON output file, "-" for stdout')
+    args = parser.parse_args(args)
+    result = analyze(args.trajectory, args.statistics)
+    if args.output == '-':
+        json.dump(result, sys.stdout)
+        sys.stdout.write('\n')
+    else:
+        with open(args.output, 'w') as f:
+            json.dump(result, f)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017-2023 Denis Meyer
+#
+# This file is part of the monopoly probabilities application.
+#
+
+"""Monopoly Probabilities - Sweep
+
+Runs a grid of board and rule variants on a process pool and streams one CSV row per finished variant.
+
+The grid file is JSON, e.g.
+    {"seed": 1,
+     "grid": {"rules": ["simple", "full"], "nrofdice": [2, 3], "maxjailturns": [0, 3],
+              "engine": ["markov", "batch"], "rolls": 100000000}}
+Lists are swept, single values are fixed, "grid" may also be a list of such grids.
+Keys other than engine, rolls and board (a board file) override attributes of the board.
+"""
+
+import argparse
+import concurrent.futures
+import csv
+import itertools
+import json
+import os
+import sys
+import time
+import numpy as np
+
+from data.board import Board, loadboard
+from engines.batch import createengine
+from engines.markov import MarkovChain
+
+SETTINGS = ('engine', 'rolls', 'board')
+ENGINES = ('markov', 'batch')
+
+def expand(grid):
+    """Returns all variants of a grid"""
+    if isinstance(grid, list):
+        return [variant for subgrid in grid for variant in expand(subgrid)]
+    keys = sorted(grid)
+    values = [grid[key] if isinstance(grid[key], list) else [grid[key]] for key in keys]
+    return [dict(zip(keys, combination)) for combination in itertools.product(*values)]
+
+def makeboard(variant):
+    """Returns the board of a variant"""
+    if variant.get('engine', 'batch') not in ENGINES:
+        raise ValueError('Unknown engine \'{}\' in variant {}, expected one of {}'.format(
+            variant['engine'], json.dumps(variant, sort_keys=True), list(ENGINES)))
+    board = loadboard(variant['board']) if variant.get('board') else Board(variant.get('rules', 'simple'))
+    overrides = {key: value for key, value in variant.items() if key not in SETTINGS}
+    unknown = set(overrides) - set(board.__dict__)
+    if unknown:
+        raise ValueError('Unknown variant keys {}'.format(sorted(unknown)))
+    board.__dict__.update(overrides)
+    board.validate()
+    return board
+
+def _cell(value):
+    """Returns a CSV cell for a variant value"""
+    if value is None:
+        return ''
+    return json.dumps(value) if isinstance(value, (list, dict)) else value
+
+def _solve(jobs):
+    """Worker task, solves a batch of analytic jobs"""
+    results = []
+    for index, board in jobs:
+        start = time.monotonic()
+        probabilities = MarkovChain(board).probabilities
+        results.append((index, 0, probabilities, time.monotonic() - start))
+    return results
+
+def _simulate(index, board, nrofrolls, seed):
+    """Worker task, simulates one chunk of a job"""
+    start = time.monotonic()
+    engine = createengine(board, rng=np.random.default_rng(seed))
+    visits, _ = engine.roll(0, nrofrolls)
+    return [(index, nrofrolls, visits, time.monotonic() - start)]
+
+class Sweep:
+    """Schedules the variants of a grid on a process pool
+
+    Simulations are split into chunks and all tasks share the pool's queue, so idle
+    workers pick up the next chunk of any variant. Analytic variants are cheap and
+    solved in batches to save task overhead.
+    """
+
+    def __init__(self, grid, seed=None, chunk=10000000, analyticbatch=16, nrofprocesses=os.cpu_count()):
+        self.variants = expand(grid)
+        self.boards = [makeboard(variant) for variant in self.variants]
+        self.seed = seed
+        self.chunk = chunk
+        self.analyticbatch = analyticbatch
+        self.nrofprocesses = nrofprocesses
+        self.keys = sorted(set(key for variant in self.variants for key in variant))
+        self.nroffields = max(board.nroffields for board in self.boards)
+
+    def _tasks(self, executor):
+        """Submits all tasks, analytic ones first, returns the futures and the number of tasks per variant"""
+        nroftasks = [0] * len(self.variants)
+        analytic = []
+        simulations = []
+        for index, (variant, board) in enumerate(zip(self.variants, self.boards)):
+            if variant.get('engine', 'batch') == 'markov':
+                analytic.append((index, board))
+                nroftasks[index] = 1
+                continue
+            rolls = int(variant.get('rolls', self.chunk))
+            nrofchunks = max(1, -(-rolls // self.chunk))
+            nroftasks[index] = nrofchunks
+            seeds = np.random.SeedSequence(self.seed, spawn_key=(index,)).spawn(nrofchunks)
+            for chunkno, seed in enumerate(seeds):
+                simulations.append((index, board, min(self.chunk, rolls - chunkno * self.chunk), seed))
+        futures = [executor.submit(_solve, analytic[start:start + self.analyticbatch])
+                   for start in range(0, len(analytic), self.analyticbatch)]
+        futures += [executor.submit(_simulate, *simulation) for simulation in simulations]
+        return futures, nroftasks
+
+    def run(self, output):
+        """Runs all variants and writes one CSV row per variant as soon as it is done"""
+        writer = csv.writer(output)
+        writer.writerow(['variant'] + self.keys + ['nrofrolls', 'seconds']
+                        + ['p{}'.format(fieldno) for fieldno in range(self.nroffields)])
+        output.flush()
+        visits = [np.zeros(board.nroffields) for board in self.boards]
+        nrofrolls = [0] * len(self.variants)
+        seconds = [0.0] * len(self.variants)
+        with concurrent.futures.ProcessPoolExecutor(max_workers=self.nrofprocesses) as executor:
+            futures, remaining = self._tasks(executor)
+            for future in concurrent.futures.as_completed(futures):
+                for index, rolls, result, duration in future.result():
+                    visits[index] += result
+                    nrofrolls[index] += rolls
+                    seconds[index] += duration
+                    remaining[index] -= 1
+                    if remaining[index] == 0:
+                        probabilities = visits[index] / nrofrolls[index] if nrofrolls[index] else visits[index]
+                        variant = self.variants[index]
+                        writer.writerow([index] + [_cell(variant.get(key)) for key in self.keys]
+                                        + [nrofrolls[index], seconds[index]] + list(probabilities))
+                        output.flush()
+
+def main(args=None):
+    """Runs the sweep"""
+    parser = argparse.ArgumentParser(description='Sweeps Monopoly board and rule variants')
+    parser.add_argument('grid', help='grid definition file (JSON)')
+    parser.add_argument('--output', default='-', help='CSV output file, "-" for stdout')
+    parser.add_argument('--processes', type=int, default=os.cpu_count(), help='number of worker processes')
+    parser.add_argument('--chunk', type=int, default=10000000, help='rolls per simulation task')
+    parser.add_argument('--analytic-batch', type=int, default=16, help='analytic variants per task')
+    args = parser.parse_args(args)
+    with open(args.grid, 'r', encoding='utf-8') as f:
+        definition = json.load(f)
+    sweep = Sweep(definition['grid'],
+                  seed=definition.get('seed'),
+                  chunk=args.chunk,
+                  analyticbatch=args.analytic_batch,
+                  nrofprocesses=args.processes)
+    if args.output == '-':
+        sweep.run(sys.stdout)
+    else:
+        with open(args.output, 'w', newline='') as output:
+            sweep.run(output)
+
+if __name__ == '__main__':
+    main()
@@ -8,15 +8,68 @@
 
 """Monopoly Probabilities - Game"""
 
+import collections
+import concurrent.futures
+import os
+import sys
 import threading
 import time
 import random
-from numpy import interp
+import numpy as np
 
-from data.board import Board
+from data.board import Board, loadboard
+from data.checkpoint import read_checkpoint, write_checkpoint
+from data.shared import SharedCounters
+from data.trajectory import TrajectoryWriter
+from engines.batch import createengine, makerng
+from engines.convergence import BatchMeans
+from threads.telemetry import Telemetry
+
+class _Job:
+    """A bounded run of the game thread, ends after nrofrolls more rolls or seconds, whichever comes first"""
+
+    def __init__(self, nrofrolls=None, seconds=None):
+        self.nrofrolls = nrofrolls
+        self.seconds = seconds
+        self.target = None
+        self.deadline = None
+        self.started = False
+        # Set when a bounded run starts on a converged game, it then runs to its bounds
+        self.pastconvergence = False
+        self.future = concurrent.futures.Future()
+
+    def start(self, nrofrolls):
+        """Starts the bounds at the current number of rolls, returns False if the future was cancelled"""
+        self.started = True
+        if not self.future.set_running_or_notify_cancel():
+            return False
+        if self.nrofrolls is not None:
+            self.target = nrofrolls + self.nrofrolls
+        if self.seconds is not None:
+            self.deadline = time.monotonic() + self.seconds
+        return True
+
+    def bounded(self):
+        """Returns whether the run has a roll or time bound"""
+        return self.nrofrolls is not None or self.seconds is not None
+
+    def limit(self, nrofrolls, chunk):
+        """Returns the rolls of the next chunk, not rolling past the target"""
+        return chunk if self.target is None else min(chunk, self.target - nrofrolls)
+
+    def done(self, nrofrolls):
+        """Returns whether the target or the deadline is reached"""
+        if self.target is not None and nrofrolls >= self.target:
+            return True
+        return self.deadline is not None and time.monotonic() >= self.deadline
 
 class Game(threading.Thread):
-    """The monopoly game"""
+    """The monopoly game
+
+    The thread rolls in chunks up to the next afterround callback and only looks at the
+    control flags between chunks. Resumed, it rolls until paused; bounded runs queued with
+    run_rolls, run_for or step are executed in order, also while paused.
+    """
 
     def __init__(self,
                  callback_resumed=None,
@@ -25,12 +78,31 @@ class Game(threading.Thread):
                  afterround_n_rounds=100000,
                  afterround_sleep=0,
                  mapinterval=[0, 1],
+                 engine='scalar',
+                 rules='simple',
+                 boardfile=None,
+                 checkpoint_path=None,
+                 checkpoint_interval=60,
+                 resume=False,
+                 tolerance=None,
+                 confidence_z=1.96,
+                 seed=None,
+                 bitgenerator='PCG64',
+                 resultstore=None,
+                 shared_name=None,
+                 record_path=None,
+                 telemetry_interval=1.0,
+                 telemetry_port=None,
+                 telemetry_output=None,
                  debug=False):
         threading.Thread.__init__(self)
         self.daemon = True # OK for main to exit even if instance is still running
         self.paused = True
         self.debug = debug
         self.state = threading.Condition()
+        self.stopping = False
+        self.jobs = collections.deque()
+        self.stopped = concurrent.futures.Future()
 
         self.callback_resumed = callback_resumed
         self.callback_paused = callback_paused
@@ -38,11 +110,78 @@ class Game(threading.Thread):
         self.afterround_n_rounds = afterround_n_rounds
         self.afterround_sleep = afterround_sleep
         self.mapinterval = mapinterval
+        self.engine = engine
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_interval = checkpoint_interval
+        self.lastcheckpoint = time.monotonic()
+        self.tolerance = tolerance
+        self.confidence_z = confidence_z
+        self.converged = False
 
         self.currposition = 0
         self.nrofrolls = 0
-        self.board = Board()
+        self.board = loadboard(boardfile) if boardfile else Board(rules)
+        if self.board.rules == 'full' and engine != 'batch':
+            raise ValueError('The full rules need the batch engine')
         self.visits = [0 for i in range(self.board.nroffields)]
+        # Without a seed a fresh one is drawn and kept, so every run can be repeated.
+        # Stored results are keyed by seed, they are only found again with a fixed one.
+        if seed is None and resultstore:
+            seed = 0
+        self.seed = seed if seed is not None else np.random.SeedSequence().entropy
+        self.bitgenerator = bitgenerator
+        self.random = random.Random(self.seed)
+        self.batchengine = createengine(self.board, rng=makerng(self.seed, bitgenerator)) if engine == 'batch' else None
+        self.resultstore = resultstore
+        self.resultkey = None
+        if resultstore:
+            if checkpoint_path:
+                raise ValueError('A result store keeps its own checkpoints')
+            self.resultkey = resultstore.key(self.getconfig())
+            self.checkpoint_path = resultstore.path(self.resultkey)
+            resume = resultstore.touch(self.resultkey)
+        if self.checkpoint_path:
+            directory = os.path.dirname(os.path.abspath(self.checkpoint_path))
+            if not os.access(directory, os.W_OK):
+                raise ValueError('Checkpoint directory does not exist or is not writable: {}'.format(directory))
+        resumed = bool(resume and self.checkpoint_path and os.path.exists(self.checkpoint_path))
+        if resumed:
+            self.loadcheckpoint(self.checkpoint_path)
+        self.recorder = None
+        if record_path:
+            if self.board.rules == 'full':
+                raise ValueError('Trajectories can only be recorded with the simple rules')
+            self.recorder = TrajectoryWriter(record_path,
+                                             self.board,
+                                             startposition=self.currposition,
+                                             nrofrolls=self.nrofrolls,
+                                             resume=resumed)
+            if self.batchengine:
+                self.batchengine.recorder = self.recorder
+        self.statistics = BatchMeans(self.board.nroffields, batchsize=afterround_n_rounds)
+        self.statistics.reset(self.nrofrolls, self.visits)
+        # Immutable (nrofrolls, visits) pair, replaced as a whole by the game thread
+        self.snapshot = (self.nrofrolls, tuple(self.visits))
+        # Immutable (snapshot, largest confidence interval half-width, converged) of the same publish
+        self.metrics = (self.snapshot, self._maxhalfwidth(), self.converged)
+        # Named shared memory with the published counters, for viewers in other processes
+        self.shared = SharedCounters(shared_name, self.board) if shared_name else None
+        if self.shared:
+            self.shared.write(self.nrofrolls, self.visits)
+        self.telemetry = None
+        if telemetry_port is not None or telemetry_output:
+            self.telemetry = Telemetry(self,
+                                       interval=telemetry_interval,
+                                       port=telemetry_port,
+                                       output=telemetry_output)
+            self.telemetry.start()
+
+    def getconfig(self):
+        """Returns everything that determines the results of a run, as JSON serializable data"""
+        return {'board': self.board.gethash(),
+                'engine': self.engine,
+                'seed': self.seed,
+                'bitgenerator': self.bitgenerator}
 
     def getprobability(self, fieldno):
         """Returns the probability of a specified field"""
@@ -57,39 +196,271 @@ class Game(threading.Thread):
         _min = min(self.visits)
         _max = max(self.visits)
         _f = self.visits[fieldno]
-        return interp(_f, [_min, _max], self.mapinterval)
+        return np.interp(_f, [_min, _max], self.mapinterval)
+
+    def getstandarderror(self, fieldno):
+        """Returns the batch-means standard error of the probability of a specified field"""
+        if fieldno < 0 or fieldno >= self.board.nroffields:
+            return 0
+        return self.statistics.standarderrors()[fieldno]
+
+    def getstandarderrors(self):
+        """Returns the batch-means standard errors of the probabilities of all fields"""
+        return self.statistics.standarderrors()
+
+    def getsnapshot(self):
+        """Returns the number of rolls, the probabilities and the mapped probabilities of all fields
+        as of the last published snapshot"""
+        nrofrolls, visits = self.snapshot
+        visits = np.array(visits, dtype=np.float64)
+        if nrofrolls <= 0:
+            return nrofrolls, np.zeros(self.board.nroffields), np.zeros(self.board.nroffields)
+        mapped = np.interp(visits, [visits.min(), visits.max()], self.mapinterval)
+        return nrofrolls, visits / nrofrolls, mapped
+
+    def getmetrics(self):
+        """Returns the rolls, the visits per field, the largest confidence interval half-width
+        and whether the run converged, as of the last published snapshot"""
+        (nrofrolls, visits), error, converged = self.metrics
+        return {'timestamp': time.time(),
+                'rolls': nrofrolls,
+                'visits': list(visits),
+                'error': error,
+                'converged': converged}
+
+    def _maxhalfwidth(self):
+        """Returns the largest confidence interval half-width of the current statistics"""
+        return float(self.statistics.halfwidths(self.confidence_z).max())
+
+    def _publish(self):
+        """Publishes a snapshot of the current counters, called by the game thread only"""
+        self.snapshot = (self.nrofrolls, tuple(self.visits))
+        self.metrics = (self.snapshot, self._maxhalfwidth(), self.converged)
+        if self.shared:
+            self.shared.write(self.nrofrolls, self.visits, self.converged)
+
+    def getrngstate(self):
+        """Returns the state of the random generator as JSON serializable data"""
+        if self.batchengine:
+            return {'engine': 'batch', 'state': self.batchengine.getstate()}
+        version, internalstate, gauss_next = self.random.getstate()
+        return {'engine': 'scalar', 'state': [version, list(internalstate), gauss_next]}
+
+    def setrngstate(self, rngstate):
+        """Restores the state of the random generator"""
+        if rngstate['engine'] != ('batch' if self.batchengine else 'scalar'):
+            raise ValueError('Random state of engine \'{}\' does not match'.format(rngstate['engine']))
+        if self.batchengine:
+            self.batchengine.setstate(rngstate['state'])
+        else:
+            version, internalstate, gauss_next = rngstate['state']
+            self.random.setstate((version, tuple(internalstate), gauss_next))
+
+    def savecheckpoint(self, path):
+        """Saves the counters and the random generator state, called by the game thread only"""
+        write_checkpoint(path, self.nrofrolls, self.currposition, self.visits, self.getrngstate())
+        self.lastcheckpoint = time.monotonic()
+        if self.resultstore:
+            self.resultstore.evict(keep=self.resultkey)
+        if self.debug:
+            print('Written checkpoint at {} rolls to {}'.format(self.nrofrolls, path))
+
+    def loadcheckpoint(self, path):
+        """Continues from a saved checkpoint"""
+        nrofrolls, currposition, visits, rngstate = read_checkpoint(path)
+        if len(visits) != self.board.nroffields:
+            raise ValueError('Checkpoint has {} fields, board has {}'.format(len(visits), self.board.nroffields))
+        self.setrngstate(rngstate)
+        self.nrofrolls = nrofrolls
+        self.currposition = currposition
+        self.visits = visits
+        print('Resuming from checkpoint {} at {:,} rolls'.format(path, nrofrolls), file=sys.stderr)
+
+    def _checkpoint(self, force=False):
+        """Saves a checkpoint if configured and due"""
+        if self.checkpoint_path and (force or time.monotonic() - self.lastcheckpoint >= self.checkpoint_interval):
+            self.savecheckpoint(self.checkpoint_path)
+
+    def _updatestatistics(self):
+        """Adds the latest rolls to the statistics and stops once converged"""
+        self.statistics.update(self.nrofrolls, self.visits)
+        if self.tolerance and not self.converged and self.statistics.converged(self.tolerance, self.confidence_z):
+            if self.debug:
+                print('Converged after {} rolls'.format(self.nrofrolls))
+            self._converge()
+
+    def _converge(self):
+        """Pauses the thread on its own, called by the game thread only"""
+        self.converged = True
+        with self.state:
+            self.paused = True
+
+    def _afterround(self):
+        """Updates the statistics, publishes a snapshot, checkpoints if due and calls the afterround callback"""
+        self._updatestatistics()
+        self._publish()
+        self._checkpoint()
+        if self.callback_afterround:
+            self.callback_afterround()
 
     def run(self):
-        """Starts the thread"""
+        """Starts the thread, rolls chunk by chunk until stopped
+
+        If the thread fails, every run and the stopped future fail with the same error.
+        """
+        try:
+            self._loop()
+            self._shutdown()
+        except BaseException as e:
+            self._fail(e)
+            raise
+
+    def _loop(self):
+        """Rolls chunk by chunk and runs the queued runs until stopped"""
+        idle = False
         while True:
             with self.state:
-                if self.paused:
+                job = self._nextjob()
+                while job is None and self.paused and not self.stopping:
+                    if not idle:
+                        self._publish()
+                        self._checkpoint(force=self.nrofrolls > 0)
+                        idle = True
                     self.state.wait() # block until notified
-            self.nrofrolls += 1
-            diceroll1 = random.randint(0, 6)
-            diceroll2 = random.randint(0, 6)
-            self.currposition = (self.currposition + diceroll1 + diceroll2) % 40
-            if self.debug:
-                print('Dice 1: {}, Dice 2: {}, Current Position: {}'
-                      .format(diceroll1, diceroll2, self.currposition))
-            # Jump to jail if on special jail field
-            if self.currposition == self.board.jailfield:
-                if self.debug:
-                    print('Going to jail')
-                self.visits[self.currposition] += 1
-                self.currposition = 10
-            self.visits[self.currposition] += 1
-            if (self.nrofrolls % self.afterround_n_rounds == 0) and self.callback_afterround:
-                self.callback_afterround()
+                    job = self._nextjob()
+                if self.stopping:
+                    break
+            idle = False
+            nrofrolls = self.afterround_n_rounds - self.nrofrolls % self.afterround_n_rounds
+            if job:
+                nrofrolls = job.limit(self.nrofrolls, nrofrolls)
+            self._rollchunk(nrofrolls)
+            if self.nrofrolls % self.afterround_n_rounds == 0:
+                self._afterround()
+            if job and self._jobdone(job):
+                self._finishjob()
             if self.afterround_sleep > 0:
                 time.sleep(self.afterround_sleep)
 
+    def _nextjob(self):
+        """Returns the current bounded run, starting the next queued one if needed, called with the state held"""
+        while self.jobs:
+            job = self.jobs[0]
+            if not job.started:
+                if not job.start(self._scheduledrolls()):
+                    self.jobs.popleft() # cancelled while queued
+                    continue
+                job.pastconvergence = self.converged and job.bounded()
+            if self._jobdone(job):
+                self._finishjob()
+            else:
+                return job
+        return None
+
+    def _scheduledrolls(self):
+        """Returns the rolls a bounded run starts counting from"""
+        return self.nrofrolls
+
+    def _jobdone(self, job):
+        """Returns whether a run is done, runs end once the game converges unless it converged before"""
+        return (self.converged and not job.pastconvergence) or job.done(self.nrofrolls)
+
+    def _finishjob(self):
+        """Publishes the counters and completes the current bounded run with the number of rolls"""
+        with self.state:
+            job = self.jobs.popleft()
+            self._updatestatistics()
+            self._publish()
+            job.future.set_result(self.nrofrolls)
+
+    def _shutdown(self):
+        """Ends the queued runs, publishes and checkpoints a last time, called by the game thread once stopped"""
+        with self.state:
+            while self.jobs:
+                job = self.jobs.popleft()
+                if job.started:
+                    job.future.set_result(self.nrofrolls)
+                else:
+                    job.future.cancel()
+        self._updatestatistics()
+        self._publish()
+        self._checkpoint(force=self.nrofrolls > 0)
+        self.stopped.set_result(self.nrofrolls)
+
+    def _fail(self, error):
+        """Fails the current and the queued runs and the stopped future, called by the game thread"""
+        with self.state:
+            self.stopping = True
+            while self.jobs:
+                job = self.jobs.popleft()
+                if not job.future.done():
+                    job.future.set_exception(error)
+            if not self.stopped.done():
+                self.stopped.set_exception(error)
+
+    def roll(self, nrofrolls):
+        """Rolls the dice nrofrolls times on the calling thread and publishes a snapshot"""
+        self._rollchunk(nrofrolls)
+        self._updatestatistics()
+        self._publish()
+        self._checkpoint()
+
+    def _rollchunk(self, nrofrolls):
+        """Rolls the dice nrofrolls times without looking at the control flags"""
+        if self.batchengine:
+            self._roll_batch(nrofrolls)
+        else:
+            for _ in range(nrofrolls):
+                self._roll_scalar()
+
+    def _roll_scalar(self):
+        """Rolls the dice once"""
+        self.nrofrolls += 1
+        dicerolls = [self.random.randint(self.board.dicemin, self.board.dicemax)
+                     for _ in range(self.board.nrofdice)]
+        self.currposition = (self.currposition + sum(dicerolls)) % self.board.nroffields
+        if self.debug:
+            print('Dice: {}, Current Position: {}'.format(dicerolls, self.currposition))
+        # Jump to jail if on special jail field
+        if self.currposition == self.board.jailfield:
+            if self.debug:
+                print('Going to jail')
+            self.visits[self.currposition] += 1
+            self.currposition = self.board.jailposition
+        self.visits[self.currposition] += 1
+        if self.recorder:
+            self.recorder.append(dicerolls, self.currposition)
+
+    def _roll_batch(self, nrofrolls):
+        """Rolls the dice nrofrolls times in vectorized batches"""
+        visits, self.currposition = self.batchengine.roll(self.currposition, nrofrolls)
+        for fieldno, fieldvisits in enumerate(visits):
+            self.visits[fieldno] += int(fieldvisits)
+        self.nrofrolls += nrofrolls
+        if self.debug:
+            print('Rolled {} times, Current Position: {}'.format(nrofrolls, self.currposition))
+
+    def close(self):
+        """Stops the telemetry, removes the shared counters and closes the trajectory"""
+        if self.telemetry:
+            self.telemetry.stop()
+            self.telemetry = None
+        shared, self.shared = self.shared, None # stop publishing before closing
+        if shared:
+            shared.close()
+        if self.recorder:
+            self.recorder.close()
+            self.recorder = None
+            if self.batchengine:
+                self.batchengine.recorder = None
+
     def resume(self):
         """Resumes the thread"""
         with self.state:
             if self.callback_resumed:
                 self.callback_resumed()
             self.paused = False
+            self.converged = False
             self.state.notify() # unblock self if waiting
 
     def pause(self):
@@ -98,3 +469,44 @@ class Game(threading.Thread):
             if self.callback_paused:
                 self.callback_paused()
             self.paused = True # make self block and wait
+
+    def submit(self, nrofrolls=None, seconds=None):
+        """Queues a run of nrofrolls more rolls or seconds, whichever ends first, starts the thread if needed
+
+        Without bounds the run ends once converged. Returns a future of the number of
+        rolls at the end of the run, cancelling it drops the run if it did not start yet.
+        """
+        job = _Job(nrofrolls, seconds)
+        with self.state:
+            if self.stopping:
+                raise RuntimeError('The game is stopped')
+            self.jobs.append(job)
+            self.state.notify()
+            if self.ident is None:
+                self.start()
+        return job.future
+
+    def run_rolls(self, nrofrolls):
+        """Queues a run of nrofrolls more rolls, returns a future of the number of rolls"""
+        return self.submit(nrofrolls=nrofrolls)
+
+    def run_for(self, seconds):
+        """Queues a run of the given seconds, returns a future of the number of rolls"""
+        return self.submit(seconds=seconds)
+
+    def step(self):
+        """Queues a run of one round of afterround_n_rounds rolls, returns a future of the number of rolls"""
+        return self.submit(nrofrolls=self.afterround_n_rounds)
+
+    def stop(self):
+        """Stops the thread after the current chunk, returns a future of the final number of rolls
+
+        A started run ends early, queued runs are cancelled. The counters are published
+        and checkpointed once more, join() waits for the thread to end.
+        """
+        with self.state:
+            self.stopping = True
+            self.state.notify()
+            if self.ident is None and not self.stopped.done():
+                self.stopped.set_result(self.nrofrolls)
+        return self.stopped
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017-2023 Denis Meyer
+#
+# This file is part of the monopoly probabilities application.
+#
+
+"""Monopoly Probabilities - Parallel Game"""
+
+import collections
+import multiprocessing
+import os
+import queue
+import time
+import numpy as np
+
+from data.checkpoint import write_checkpoint
+from engines.batch import createengine, makerng
+from threads.game import Game
+
+def _simulate(workerno, seed, bitgenerator, board, state, tasks, results):
+    """Worker process, rolls the requested batches on its own random stream and sends the visit deltas back
+
+    Every result carries the engine state and the position after it, so a checkpoint
+    can continue the stream right after the last merged result.
+    """
+    engine = createengine(board, rng=makerng(seed, bitgenerator))
+    currposition = 0
+    if state:
+        engine.setstate(state['engine'])
+        currposition = state['position']
+    while True:
+        nrofrolls = tasks.get()
+        visits, currposition = engine.roll(currposition, nrofrolls)
+        results.put((workerno, visits, nrofrolls, {'engine': engine.getstate(), 'position': currposition}))
+
+class ParallelGame(Game):
+    """The monopoly game, simulated by independent worker processes
+
+    Every worker rolls on its own stream spawned from the seed. Messages of up to
+    rolls_per_message rolls are handed out round robin, at most messagesinflight per
+    worker, and merged in the same order, not in arrival order. The last message of a
+    bounded run only covers the rolls left, so runs end exactly at their target. The
+    counters depend on the seed, the number of workers, rolls_per_message and the
+    bounds of the runs; runs in pieces of multiples of rolls_per_message equal one run.
+    Checkpoints keep the stream state of every worker after its last merged result,
+    a resumed run continues exactly as the uninterrupted one.
+    """
+
+    def __init__(self,
+                 nrofprocesses=os.cpu_count(),
+                 rolls_per_message=1000000,
+                 controlinterval=0.1,
+                 messagesinflight=2,
+                 **kwargs):
+        if kwargs.get('record_path'):
+            raise ValueError('Trajectories cannot be recorded by worker processes')
+        kwargs['engine'] = 'batch'
+        # Part of the configuration, needed by Game.__init__ to look up stored results
+        self.nrofprocesses = nrofprocesses
+        self.rolls_per_message = rolls_per_message
+        # Stream state after the last merged result of every worker and the next worker to merge,
+        # restored by Game.__init__ when resuming
+        self.workerstates = [None] * nrofprocesses
+        self.nextworker = 0
+        Game.__init__(self, **kwargs)
+        # Seconds between looks at the control flags while no results arrive
+        self.controlinterval = controlinterval
+        self.messagesinflight = messagesinflight
+        self.pending = [collections.deque() for _ in range(nrofprocesses)]
+        self.checkpointstate = (self.snapshot, self.getrngstate())
+        # Rolls handed out so far, merged or not, and the messages handed out but not returned per worker
+        self.assigned = self.nrofrolls
+        self.inflight = [0] * nrofprocesses
+        self.nextassign = self.nextworker
+        self.context = multiprocessing.get_context('spawn') # Do not fork a running Tk
+        self.tasks = [self.context.Queue() for _ in range(nrofprocesses)]
+        self.results = self.context.Queue()
+        self.processes = []
+
+    def getconfig(self):
+        """Returns everything that determines the results of a run, as JSON serializable data"""
+        config = Game.getconfig(self)
+        config.update(processes=self.nrofprocesses, rolls_per_message=self.rolls_per_message)
+        return config
+
+    def getrngstate(self):
+        """Returns the stream states of the workers as JSON serializable data"""
+        return {'engine': 'parallel',
+                'state': {'processes': self.nrofprocesses,
+                          'nextworker': self.nextworker,
+                          'workers': list(self.workerstates)}}
+
+    def setrngstate(self, rngstate):
+        """Restores the stream states of the workers"""
+        if rngstate['engine'] != 'parallel':
+            raise ValueError('Random state of engine \'{}\' does not match'.format(rngstate['engine']))
+        state = rngstate['state']
+        if state['processes'] != self.nrofprocesses:
+            raise ValueError('Checkpoint has {} processes, game has {}'.format(state['processes'], self.nrofprocesses))
+        self.workerstates = state['workers']
+        self.nextworker = state['nextworker']
+
+    def _publish(self):
+        """Publishes a snapshot and the matching worker states for checkpoints"""
+        Game._publish(self)
+        self.checkpointstate = (self.snapshot, self.getrngstate())
+
+    def savecheckpoint(self, path):
+        """Saves the last published snapshot and the worker states, may be called from any thread"""
+        (nrofrolls, visits), rngstate = self.checkpointstate
+        write_checkpoint(path, nrofrolls, 0, visits, rngstate)
+        self.lastcheckpoint = time.monotonic()
+        if self.resultstore:
+            self.resultstore.evict(keep=self.resultkey)
+
+    def _start_processes(self):
+        """Starts one worker per process with its own random stream"""
+        seeds = np.random.SeedSequence(self.seed).spawn(self.nrofprocesses)
+        for workerno, seed in enumerate(seeds):
+            process = self.context.Process(target=_simulate,
+                                           args=(workerno,
+                                                 seed,
+                                                 self.bitgenerator,
+                                                 self.board,
+                                                 self.workerstates[workerno],
+                                                 self.tasks[workerno],
+                                                 self.results),
+                                           daemon=True)
+            process.start()
+            self.processes.append(process)
+
+    def _loop(self):
+        """Hands out messages and merges the worker results until stopped, stops the workers on the way out"""
+        self._start_processes()
+        try:
+            self._merging()
+        finally:
+            for process in self.processes:
+                process.terminate()
+                process.join()
+
+    def _merging(self):
+        """Hands out messages and merges the worker results until stopped"""
+        lastcallback = 0
+        idle = False
+        while True:
+            with self.state:
+                job = self._nextjob()
+                if self.stopping:
+                    break
+                if job:
+                    limit = job.target
+                elif self.paused:
+                    limit = self.assigned
+                else:
+                    limit = None
+            self._assign(limit)
+            if job is None and self.paused and not idle and self.nrofrolls == self.assigned:
+                self._publish()
+                self._checkpoint(force=self.nrofrolls > 0)
+                idle = True
+            try:
+                workerno, visits, nrofrolls, state = self.results.get(timeout=self.controlinterval)
+                self.inflight[workerno] -= 1
+                self.pending[workerno].append((visits, nrofrolls, state))
+            except queue.Empty:
+                pass
+            if self._merge():
+                idle = False
+                if self.nrofrolls - lastcallback >= self.afterround_n_rounds:
+                    lastcallback = self.nrofrolls
+                    self._afterround()
+                if self.afterround_sleep > 0:
+                    time.sleep(self.afterround_sleep)
+            if job and self._jobdone(job):
+                self._finishjob()
+
+    def _scheduledrolls(self):
+        """Returns the rolls handed out, a bounded run counts from there"""
+        return self.assigned
+
+    def _assign(self, limit):
+        """Hands out messages round robin while the next worker has room, up to limit rolls unless None"""
+        while self.inflight[self.nextassign] < self.messagesinflight and (limit is None or self.assigned < limit):
+            nrofrolls = self.rolls_per_message
+            if limit is not None:
+                nrofrolls = min(nrofrolls, limit - self.assigned)
+            self.tasks[self.nextassign].put(nrofrolls)
+            self.inflight[self.nextassign] += 1
+            self.assigned += nrofrolls
+            self.nextassign = (self.nextassign + 1) % self.nrofprocesses
+
+    def _merge(self):
+        """Merges the pending results in the order they were handed out, returns whether any were merged"""
+        merged = False
+        while self.pending[self.nextworker]:
+            visits, nrofrolls, state = self.pending[self.nextworker].popleft()
+            for fieldno, fieldvisits in enumerate(visits):
+                self.visits[fieldno] += int(fieldvisits)
+            self.nrofrolls += nrofrolls
+            self.workerstates[self.nextworker] = state
+            self.nextworker = (self.nextworker + 1) % self.nrofprocesses
+            merged = True
+            if self.debug:
+                print('Merged {} rolls, Total: {}'.format(nrofrolls, self.nrofrolls))
+        return merged
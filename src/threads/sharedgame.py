@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017-2023 Denis Meyer
+#
+# This file is part of the monopoly probabilities application.
+#
+
+"""Monopoly Probabilities - Shared Game"""
+
+from data.board import fromdict
+from data.shared import SharedCounters
+from threads.game import Game
+
+class SharedGame:
+    """Read-only view of a game that publishes its counters to shared memory in another process
+
+    Offers the snapshot interface of Game, the counters are read straight from the
+    shared block and only copied when the writer published something new.
+    """
+
+    def __init__(self,
+                 name,
+                 callback_resumed=None,
+                 callback_paused=None,
+                 mapinterval=[0, 1]):
+        self.counters = SharedCounters(name)
+        self.board = fromdict(self.counters.definition)
+        self.callback_resumed = callback_resumed
+        self.callback_paused = callback_paused
+        self.mapinterval = mapinterval
+        self.sequence = None
+        self.converged = False
+        self._snapshot = (0, (0,) * self.board.nroffields)
+
+    @property
+    def snapshot(self):
+        """Returns the last published (nrofrolls, visits) pair, the same object until the writer publishes"""
+        data = self.counters.read(self.sequence)
+        if data:
+            self.sequence, nrofrolls, visits, self.converged = data
+            self._snapshot = (nrofrolls, tuple(visits.tolist()))
+        return self._snapshot
+
+    @property
+    def nrofrolls(self):
+        """Returns the number of rolls of the last published snapshot"""
+        return self.snapshot[0]
+
+    getsnapshot = Game.getsnapshot
+
+    def start(self):
+        """Nothing to start, the game runs in its own process"""
+
+    def resume(self):
+        """The game cannot be controlled from a viewer"""
+        if self.callback_resumed:
+            self.callback_resumed()
+
+    def pause(self):
+        """The game cannot be controlled from a viewer"""
+        if self.callback_paused:
+            self.callback_paused()
+
+    def close(self):
+        """Detaches from the shared counters"""
+        self.counters.close()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017-2023 Denis Meyer
+#
+# This file is part of the monopoly probabilities application.
+#
+
+"""Monopoly Probabilities - Telemetry
+
+Publishes the progress of a game at a fixed interval, in Prometheus text format over
+a local HTTP endpoint and as newline-delimited JSON to a file or a TCP socket.
+"""
+
+import http.server
+import json
+import math
+import socket
+import sys
+import threading
+import time
+
+def _number(value):
+    """Returns a JSON serializable number, None if not finite"""
+    return float(value) if math.isfinite(value) else None
+
+def prometheus(metrics):
+    """Returns the metrics in Prometheus text exposition format"""
+    lines = [
+        '# HELP monopoly_rolls_total Dice rolls simulated.',
+        '# TYPE monopoly_rolls_total counter',
+        'monopoly_rolls_total {}'.format(metrics['rolls']),
+        '# HELP monopoly_rolls_per_second Dice rolls per second over the last interval.',
+        '# TYPE monopoly_rolls_per_second gauge',
+        'monopoly_rolls_per_second {}'.format(metrics['rolls_per_second']),
+        '# HELP monopoly_field_visits_total Visits per field.',
+        '# TYPE monopoly_field_visits_total counter'
+    ]
+    lines += ['monopoly_field_visits_total{{field="{}"}} {}'.format(fieldno, visits)
+              for fieldno, visits in enumerate(metrics['visits'])]
+    lines += [
+        '# HELP monopoly_convergence_error Largest confidence interval half-width of the field probabilities.',
+        '# TYPE monopoly_convergence_error gauge',
+        'monopoly_convergence_error {}'.format('+Inf' if metrics['error'] is None else metrics['error']),
+        '# HELP monopoly_converged Whether the convergence tolerance is reached.',
+        '# TYPE monopoly_converged gauge',
+        'monopoly_converged {}'.format(int(metrics['converged']))
+    ]
+    return '\n'.join(lines) + '\n'
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    """Serves the last rendered metrics"""
+
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        body = self.server.telemetry.text.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class Telemetry(threading.Thread):
+    """Samples game.getmetrics() every interval seconds on its own thread
+
+    The game only publishes immutable snapshots, so sampling never touches the roll loop.
+    output is a file path or 'tcp://host:port', port serves /metrics on host.
+    """
+
+    def __init__(self, game, interval=1.0, port=None, host='127.0.0.1', output=None):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.game = game
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.last = None
+        self.text = prometheus(self._sample())
+        self.server = None
+        self.serverthread = None
+        if port is not None:
+            self.server = http.server.ThreadingHTTPServer((host, port), _Handler)
+            self.server.daemon_threads = True
+            self.server.telemetry = self
+            self.serverthread = threading.Thread(target=self.server.serve_forever, daemon=True)
+            self.serverthread.start()
+        self.stream = None
+        if output:
+            if output.startswith('tcp://'):
+                address, _, streamport = output[len('tcp://'):].rpartition(':')
+                self.stream = socket.create_connection((address, int(streamport))).makefile('w', encoding='utf-8')
+            else:
+                self.stream = open(output, 'a', encoding='utf-8')
+
+    def _sample(self):
+        """Returns the current metrics with the roll rate since the last sample"""
+        metrics = self.game.getmetrics()
+        now = time.monotonic()
+        rate = 0.0
+        if self.last is not None and now > self.last[0]:
+            rate = (metrics['rolls'] - self.last[1]) / (now - self.last[0])
+        self.last = (now, metrics['rolls'])
+        metrics['rolls_per_second'] = rate
+        metrics['error'] = _number(metrics['error'])
+        return metrics
+
+    def publish(self):
+        """Samples the game and publishes the metrics"""
+        metrics = self._sample()
+        self.text = prometheus(metrics)
+        if self.stream:
+            try:
+                self.stream.write(json.dumps(metrics) + '\n')
+                self.stream.flush()
+            except OSError as e:
+                print('Stopping telemetry stream', e, file=sys.stderr)
+                self.stream = None
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.publish()
+
+    def stop(self):
+        """Waits for the sampling thread, publishes a last time and closes the endpoint and the stream"""
+        self.stopped.set()
+        if self.ident is not None:
+            self.join()
+        self.publish()
+        if self.server:
+            self.server.shutdown()
+            self.serverthread.join()
+            self.server.server_close()
+        if self.stream:
+            self.stream.close()
+            self.stream = None